@@ -0,0 +1,2 @@
+from .api import build_plan, build_versions, DocPlan
+from .sinks import OutputSink, FileSystemSink, MemorySink, ArchiveSink
@@ -1,11 +1,18 @@
 import argparse
 import logging
 from datetime import datetime
-from .tree import generate_tree
-from .templates import generate_rst, generate_sphinx, generate_docs_dir
-from .artifacts import log_artifacts, destroy
+from functools import partial
+from .api import build_plan, build_versions, version_dirname
+from .artifacts import destroy, update_artifacts
+from .compress import precompress, COMPRESS_FORMATS
+from .sinks import FileSystemSink, ArchiveSink
+from .templates import PAGE_LAYOUTS
+from .shard import parse_shard, merge_shards
+from .metrics import PrometheusExporter
+from .intersphinx import parse_intersphinx, DEFAULT_TTL
+from .serve import PreviewSite, run_server
 from os import system
-from os.path import exists
+from os.path import exists, join
 from sys import platform
 
 
@@ -54,6 +61,15 @@ def main():
         ),
         default='.'
     )
+    cleaner.add_argument(
+        '--metrics-file', dest='metrics_file',
+        type=str,
+        help=(
+            'Write counters and histograms of the run to this file in the '
+            'Prometheus textfile format.'
+        ),
+        default=None
+    )
     cleaner.add_argument(
         '-v', '--verbose',
         action='count',
@@ -163,6 +179,68 @@ def main():
         ),
         default=[]
     )
+    creator.add_argument(
+        '--mock-imports', dest='MOCK_IMPORTS',
+        nargs='*',
+        help=(
+            'Modules that autodoc mocks instead of importing. By default '
+            'the third party imports of the project are mocked; pass the '
+            'option without values to disable mocking.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--intersphinx', dest='intersphinx',
+        nargs='+',
+        type=parse_intersphinx,
+        help=(
+            'Inventories of other projects formatted as NAME=URL or '
+            'NAME=URL=INVENTORY (a local objects.inv to import). The '
+            'inventories are cached and copied to SOURCE_DIR, conf.py reads '
+            'them locally so the build never waits on the network. '
+            'sphinx.ext.intersphinx is added to the extensions.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--intersphinx-cache', dest='intersphinx_cache',
+        type=str,
+        help=(
+            'Directory of the inventory cache. Defaults to '
+            '$XDG_CACHE_HOME/autodoc_ext/intersphinx.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--intersphinx-ttl', dest='intersphinx_ttl',
+        type=int,
+        help=(
+            'Seconds before a cached inventory is fetched again. When the '
+            'server can not be reached the cached inventory is used and '
+            'the next attempt waits for another TTL.'
+        ),
+        default=DEFAULT_TTL
+    )
+    creator.add_argument(
+        '--intersphinx-offline', dest='intersphinx_offline',
+        help=(
+            'Never fetch inventories from the network, use the cached '
+            'inventories (and local INVENTORY files) only.'
+        ),
+        action='store_true'
+    )
+    creator.add_argument(
+        '--build-timing', dest='build_timing',
+        type=str,
+        help=(
+            'Write a report of the read and write time and output size of '
+            'every page to this file (relative to SOURCE_DIR) during the '
+            'sphinx build, slowest page first. A `.csv` extension writes '
+            'CSV, anything else JSON. autodoc_ext.timing is added to the '
+            'extensions.'
+        ),
+        default=None
+    )
     creator.add_argument(
         '--hide_artifacts',
         help=(
@@ -172,6 +250,268 @@ def main():
         action='store_true'
     )
     creator.add_argument(
+        '--public-api', dest='public_api',
+        help=(
+            'Only document the public API: the names in the __all__ of '
+            'every module, or its top level classes and functions that do '
+            'not start with an underscore. Private modules and nested '
+            'classes are not documented.'
+        ),
+        action='store_true'
+    )
+    creator.add_argument(
+        '--symbol-index', dest='symbol_index',
+        help=(
+            'Write a compact index of the documented modules, classes and '
+            'functions (page, anchor, kind and first docstring line), '
+            'sharded by top level package, to the symbols directory of the '
+            'HTML output. Unchanged shards are not written again.'
+        ),
+        action='store_true'
+    )
+    creator.add_argument(
+        '--page-layout', dest='page_layout',
+        choices=PAGE_LAYOUTS,
+        help=(
+            'Layout of the generated rst pages. `package` documents every '
+            'module of a package on the package page, `module` creates one '
+            'page per module.'
+        ),
+        default='package'
+    )
+    creator.add_argument(
+        '--max-page-directives', dest='max_page_directives',
+        type=int,
+        help=(
+            'Split a package page into additional part pages once it '
+            'contains this many directives.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--max-page-bytes', dest='max_page_bytes',
+        type=int,
+        help=(
+            'Split a package page into additional part pages once it '
+            'grows past this many bytes.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--cache-dir', dest='cache_dir',
+        type=str,
+        help=(
+            'Directory of a content addressed cache for the parse results '
+            'and rendered pages. The directory can be shared by concurrent '
+            'processes and hosts.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--cache-max-bytes', dest='cache_max_bytes',
+        type=int,
+        help=(
+            'Maximum size of the cache directory, the least recently used '
+            'entries are evicted after the run.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--max-file-bytes', dest='max_file_bytes',
+        type=int,
+        help=(
+            'Source files larger than this are scanned for classes and '
+            'imports instead of being parsed.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--parse-timeout', dest='parse_timeout',
+        type=float,
+        help=(
+            'Seconds that a large source file may take to parse. Files that '
+            'exceed the budget are scanned instead.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--emit-archive', dest='emit_archive',
+        type=str,
+        help=(
+            'Stream every generated file (and the artifacts file) into a '
+            'single archive (.zip, .tar, .tar.gz, .tar.bz2, .tar.xz or '
+            '.tar.zst) instead of writing them to SOURCE_DIR. Sphinx is '
+            'not executed.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--shard', dest='shard',
+        type=parse_shard,
+        help=(
+            'Only generate the pages of the packages assigned to shard I of '
+            'N (formatted as I/N). The packages are balanced across the '
+            'shards by their file and class counts. Sphinx is not executed, '
+            'combine the shards with `docu merge`.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--walk-workers', dest='walk_workers',
+        type=int,
+        help=(
+            'List up to this many directories of the project concurrently. '
+            'Speeds up the walk on network filesystems (NFS, FUSE).'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--tree-snapshot', dest='tree_snapshot',
+        type=str,
+        help=(
+            'File holding a snapshot of the directory walk. Directories '
+            'whose modification time and inode are unchanged since the '
+            'last run are not listed again, unchanged files are not parsed '
+            'again. The file is updated after every run.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--changed-since', dest='changed_since',
+        type=str,
+        help=(
+            'Git reference (e.g. origin/main). Only the packages with files '
+            'that changed since the merge base of the reference and HEAD, '
+            'and their parent packages, are documented.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--versions', dest='versions',
+        nargs='+',
+        help=(
+            'Document these git references (tags, branches or commits) of '
+            'the project instead of the working tree. The sources are read '
+            'from the git repository, every version is generated in its own '
+            'directory of SOURCE_DIR.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--precompress', dest='precompress',
+        nargs='+',
+        choices=sorted(COMPRESS_FORMATS),
+        help=(
+            'After the build, write compressed siblings (.gz and/or .br) of '
+            'the html, css, js and other text files of BUILD_DIR so static '
+            'servers can send them as they are. Brotli requires the brotli '
+            'package.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '--metrics-file', dest='metrics_file',
+        type=str,
+        help=(
+            'Write counters and histograms of the run to this file in the '
+            'Prometheus textfile format.'
+        ),
+        default=None
+    )
+    creator.add_argument(
+        '-v', '--verbose',
+        action='count',
+        default=0,
+        help='Verbosity level for logging'
+    )
+
+    merger = subparsers.add_parser('merge')
+    merger.add_argument(
+        'SHARDS', metavar='shards',
+        nargs='+',
+        help='Installation directories of the shards created with --shard'
+    )
+    merger.add_argument(
+        '-s', '--install_dir', dest='SOURCE_DIR',
+        type=str,
+        help=(
+            'Installation directory for the merged artifacts. This will be '
+            'the site where project documentation is generated.'
+        ),
+        default='.'
+    )
+    merger.add_argument(
+        '--hide_artifacts',
+        help=(
+            'When present, the artifacts file will be hidden in '
+            'the SOURCE_DIR.'
+        ),
+        action='store_true'
+    )
+    merger.add_argument(
+        '-v', '--verbose',
+        action='count',
+        default=0,
+        help='Verbosity level for logging'
+    )
+
+    server = subparsers.add_parser('serve')
+    server.add_argument(
+        'PROJECT', metavar='project',
+        type=str,
+        help='Name of the project that the application will document'
+    )
+    server.add_argument(
+        '-d', '--source_dir', dest='PROJECT_SOURCE',
+        type=str,
+        help=(
+            'Directory where the project files reside. These files should '
+            'include the ones for which documenation will be generated.'
+        ),
+        default='.'
+    )
+    server.add_argument(
+        '-t', '--theme', dest='THEME',
+        type=str,
+        help=(
+            'Sphinx docmumentation theme, see '
+            'https://www.sphinx-doc.org/en/master/usage/theming.html '
+            'for more information.'
+        ),
+        default='sphinx_rtd_theme'
+    )
+    server.add_argument(
+        '--exclusions', dest='EXCLUSIONS',
+        nargs='+',
+        help=(
+            'List of patterns, relative to SOURCE_DIR, that match files '
+            'and directories to ignore when looking for source files.'
+        ),
+        default=[]
+    )
+    server.add_argument(
+        '--mock-imports', dest='MOCK_IMPORTS',
+        nargs='*',
+        help=(
+            'Modules that autodoc mocks instead of importing. By default '
+            'the third party imports of the project are mocked; pass the '
+            'option without values to disable mocking.'
+        ),
+        default=None
+    )
+    server.add_argument(
+        '--host', dest='host',
+        type=str,
+        help='Address that the preview server listens on.',
+        default='127.0.0.1'
+    )
+    server.add_argument(
+        '-p', '--port', dest='port',
+        type=int,
+        help='Port that the preview server listens on.',
+        default=8000
+    )
+    server.add_argument(
         '-v', '--verbose',
         action='count',
         default=0,
@@ -187,7 +527,16 @@ def main():
         verbosity = logging.CRITICAL
     
     create_logger(verbosity)
-    globals()[args.command](args)
+
+    exporter = None
+    if getattr(args, "metrics_file", None):
+        exporter = PrometheusExporter().attach()
+    try:
+        globals()[args.command](args)
+    finally:
+        if exporter is not None:
+            exporter.detach()
+            exporter.write(args.metrics_file)
 
     
 def create_logger(verbosity):
@@ -209,39 +558,85 @@ def create(args):
     project and create the artifacts.
     """
     log = logging.getLogger()
-    log.info("Generating templates")
-    main_templates = generate_sphinx(**vars(args))
-    log.debug("Created the following files from templates: \n\t{}".format(
-              "\n\t".join(main_templates)))
-    
-    artifacts = {}
-    for temp in main_templates:
-        artifacts[temp] = False
+    options = vars(args).copy()
+    emit_archive = options.pop("emit_archive")
+    if emit_archive:
+        sink = ArchiveSink(emit_archive, root=args.SOURCE_DIR)
+    else:
+        sink = FileSystemSink()
+
+    versions = options.pop("versions")
+    options.pop("precompress")
+    generate = build_plan
+    if versions:
+        generate = partial(build_versions, versions)
 
-    log.info("Source Directory set to {}".format(args.PROJECT_SOURCE))
-    src_tree = generate_tree(directory=args.PROJECT_SOURCE, exclusions=args.EXCLUSIONS)
-    rst_artifacts = generate_rst(src_tree, "{}/rst_docs".format(
-        args.SOURCE_DIR))
-    artifacts.update(rst_artifacts)
-    artifacts.update(generate_docs_dir(args.SOURCE_DIR, args.BUILD_DIR))
+    with sink:
+        generate(
+            options.pop("PROJECT_SOURCE"),
+            sink=sink,
+            hide_artifacts=options.pop("hide_artifacts"),
+            **options
+        )
 
-    log_artifacts(
-        args.SOURCE_DIR, artifacts=artifacts, hide_file=args.hide_artifacts)
+    if emit_archive:
+        log.info("Generated files written to {}".format(emit_archive))
+        return
+    if args.shard:
+        log.info("Shard {}/{} generated, combine the shards with merge".format(
+            *args.shard))
+        return
+
+    source_dirs = [args.SOURCE_DIR]
+    if versions:
+        source_dirs = [
+            join(args.SOURCE_DIR, version_dirname(v)) for v in versions]
 
     log.info("Executing sphinx")
     log.debug("Attempting to make on {} ...".format(platform))
     
-    if platform.lower() in ("win32", "cygwin"):
-        log.debug("  Windows system ...")
-        if exists("{}/make.bat".format(args.SOURCE_DIR)):
-            system("cd {} && make.bat html && cd -".format(args.SOURCE_DIR))
+    for source_dir in source_dirs:
+        if platform.lower() in ("win32", "cygwin"):
+            log.debug("  Windows system ...")
+            if exists("{}/make.bat".format(source_dir)):
+                system("cd {} && make.bat html && cd -".format(source_dir))
+            else:
+                log.error("No make.bat found in {}".format(source_dir))
         else:
-            log.error("No make.bat found in {}".format(args.SOURCE_DIR))
-    else:
-        if exists("{}/Makefile".format(args.SOURCE_DIR)):
-            system("cd {} && make html && cd -".format(args.SOURCE_DIR))
-        else:
-            log.error("No Makefile found in {}".format(args.SOURCE_DIR))
+            if exists("{}/Makefile".format(source_dir)):
+                system("cd {} && make html && cd -".format(source_dir))
+            else:
+                log.error("No Makefile found in {}".format(source_dir))
+
+        if args.precompress:
+            log.info("Compressing the build of {}".format(source_dir))
+            compressed = precompress(
+                join(source_dir, args.BUILD_DIR), formats=args.precompress)
+            update_artifacts(
+                source_dir, {filename: False for filename in compressed})
+
+
+def merge(args):
+    """Combine the outputs of the shards into a single tree that is ready
+    to be built.
+    """
+    log = logging.getLogger()
+    log.info("Merging {} shards into {}".format(
+        len(args.SHARDS), args.SOURCE_DIR))
+    merge_shards(args.SHARDS, args.SOURCE_DIR, hide_file=args.hide_artifacts)
+
+
+def serve(args):
+    """Serve a preview of the documentation. Pages are generated and built
+    when they are requested.
+    """
+    options = vars(args).copy()
+    site = PreviewSite(
+        options.pop("PROJECT_SOURCE"),
+        exclusions=options.pop("EXCLUSIONS"),
+        **options
+    )
+    run_server(site, host=args.host, port=args.port)
 
 
 def clean(args):
@@ -0,0 +1,356 @@
+import re
+from json import dumps
+from logging import getLogger, INFO, WARNING
+from os.path import dirname, join
+from .args import check_args
+from .tree import generate_tree, external_imports, changed_packages, prune_tree
+from .tree import package_names
+from .tree import TreeSnapshot
+from .templates import generate_rst, generate_sphinx, generate_docs_dir
+from .templates import FragmentRenderer
+from .artifacts import log_artifacts
+from .sinks import MemorySink, FileSystemSink
+from .shard import shard_packages
+from .cache import ContentCache
+from .parse import SourceParser
+from .vcs import GitRepository, git_tree
+from .intersphinx import InventoryCache, generate_inventories
+from .intersphinx import DEFAULT_TTL, INTERSPHINX_EXTENSION
+from .timing import TIMING_EXTENSION, PACKAGES_FILENAME
+from .symbols import SymbolIndex, load_symbol_index
+from .symbols import SYMBOL_INDEX_DIR, SYMBOL_OUTPUT_DIR
+
+
+log = getLogger()
+
+
+class DocPlan:
+    """Result of a documentation generation run. The plan holds the
+    tree that was documented, the sink that received the generated files
+    and the artifacts that were created.
+    """
+
+    def __init__(self, tree, sink, artifacts, artifacts_file=None):
+        """Initialize the instance of a DocPlan
+
+        :param tree: Node that was used to generate the documents.
+        :param sink: OutputSink that received all generated files.
+        :param artifacts: Dictionary of created artifacts.
+        :param artifacts_file: Name of the artifacts file (when written).
+        """
+        self.tree = tree
+        self.sink = sink
+        self.artifacts = artifacts
+        self.artifacts_file = artifacts_file
+
+    @property
+    def pages(self):
+        """Contents of the generated files. Only available when the
+        sink keeps the files in memory (see `MemorySink`).
+
+        :return: Dictionary of filename to file contents.
+        """
+        return dict(getattr(self.sink, "files", {}))
+
+
+def _log_parse_report(parser):
+    """Log the slowest and largest source files of the run. The report is
+    a warning when the parser has a size limit or a time budget, so it is
+    shown at the default verbosity.
+
+    :param parser: SourceParser of the run, see `SourceParser.report`.
+    """
+    report = parser.report()
+    level = INFO
+    if parser.max_bytes is not None or parser.time_budget is not None:
+        level = WARNING
+    for title, key in (("Slowest", "slowest"), ("Largest", "largest")):
+        if not report[key]:
+            continue
+        log.log(level, "{} source files:".format(title))
+        for stat in report[key]:
+            log.log(level, "  {} ({} bytes, {:.3f} seconds{})".format(
+                stat["filename"], stat["bytes"], stat["seconds"],
+                ", scanned" if stat["fallback"] else ""))
+
+
+def build_plan(source=".", sink=None, hide_artifacts=False,
+               page_layout="package", max_page_directives=None,
+               max_page_bytes=None, shard=None, cache_dir=None,
+               cache_max_bytes=None, max_file_bytes=None, parse_timeout=None,
+               tree=None, walk_workers=None, changed_since=None,
+               tree_snapshot=None, intersphinx=None, intersphinx_cache=None,
+               intersphinx_ttl=DEFAULT_TTL, intersphinx_offline=False,
+               build_timing=None,
+               public_api=False, symbol_index=False, renderer=None,
+               **options):
+    """Generate the sphinx configuration, the rst documents and the
+    artifacts for the project found in `source`. Nothing is written to
+    disk unless the sink does so; the default sink keeps every file in
+    memory.
+
+    :param source: Directory where the project files reside.
+    :param sink: OutputSink receiving the files. Defaults to a MemorySink.
+    :param hide_artifacts: When true, hide the artifacts file.
+    :param page_layout: Layout of the rst pages, see `PAGE_LAYOUTS`.
+    :param max_page_directives: Split pages after this many directives.
+    :param max_page_bytes: Split pages after this many bytes.
+    :param shard: Tuple of (1-based) shard index and shard count. Only the
+    pages of the packages assigned to the shard are generated.
+    :param cache_dir: Directory of a (shared) content addressed cache for
+    the file summaries and rendered pages.
+    :param cache_max_bytes: Maximum size of the cache directory.
+    :param max_file_bytes: Source files larger than this are scanned
+    instead of parsed.
+    :param parse_timeout: Seconds a large source file may take to parse
+    before it is scanned instead.
+    :param tree: Node of the project. When provided, `source` is not
+    walked (see `vcs.git_tree`).
+    :param walk_workers: List up to this many directories of `source`
+    concurrently. Defaults to None (serial walk).
+    :param changed_since: Git reference. Only the packages with files that
+    changed since the reference, and their ancestors, are documented.
+    :param tree_snapshot: Filename of a snapshot of the walk (see
+    `tree.TreeSnapshot`). Unchanged directories and files of `source` are
+    not read again, the snapshot is updated after the generation.
+    :param intersphinx: List of tuples of project name, documentation URL
+    and inventory (see `intersphinx.parse_intersphinx`). The inventories
+    are written to SOURCE_DIR and rendered into the intersphinx mapping.
+    :param intersphinx_cache: Directory of the inventory cache.
+    :param intersphinx_ttl: Seconds before a cached inventory is fetched
+    again.
+    :param intersphinx_offline: When true, inventories are never fetched,
+    the cached inventories are used.
+    :param build_timing: Filename (relative to SOURCE_DIR, `.json` or
+    `.csv`) of the per page build timing report. Enables the
+    `autodoc_ext.timing` sphinx extension.
+    :param public_api: When true, only the names exported by the modules
+    (`__all__`, or the public top level classes and functions) are
+    documented, see `tree.Node.public_templates`.
+    :param symbol_index: When true, write the sharded index of the
+    documented symbols (see `symbols`) to SOURCE_DIR, it is copied to the
+    `symbols` directory of the HTML output. Unchanged shards are not
+    written again; shards and changed packages only update their part of
+    the index.
+    :param renderer: FragmentRenderer shared with other generations, see
+    `templates.generate_rst`.
+    :param options: See `args.check_args` for the accepted options. When
+    `MOCK_IMPORTS` is not provided (or None), the third party imports of
+    the project are mocked.
+    :return: DocPlan containing the tree, sink and artifacts.
+    """
+    sink = sink or MemorySink()
+    fargs = check_args(**options)
+    source_dir = fargs["SOURCE_DIR"]
+
+    cache = None
+    if cache_dir is not None:
+        log.info("Using cache directory {}".format(cache_dir))
+        cache = ContentCache(cache_dir, max_bytes=cache_max_bytes)
+    parser = SourceParser(
+        cache=cache, max_bytes=max_file_bytes, time_budget=parse_timeout)
+
+    snapshot = None
+    if tree is None:
+        if tree_snapshot is not None:
+            snapshot = TreeSnapshot.load(tree_snapshot, fargs["EXCLUSIONS"])
+            parser.import_summaries(snapshot.summaries)
+        log.info("Source Directory set to {}".format(source))
+        tree = generate_tree(
+            directory=source, exclusions=fargs["EXCLUSIONS"], parser=parser,
+            workers=walk_workers, snapshot=snapshot)
+
+    project = tree
+    if changed_since is not None:
+        with GitRepository(source) as repository:
+            prefix = repository.prefix(source)
+            paths = [
+                path[len(prefix) + 1:] if prefix else path
+                for path in repository.changed_paths(changed_since, prefix)
+            ]
+        changed = changed_packages(tree, paths)
+        log.info("{} packages changed since {}: {}".format(
+            len(changed), changed_since, sorted(changed)))
+        tree = prune_tree(project, changed)
+
+    if options.get("MOCK_IMPORTS") is None:
+        # only the files of the documented packages are summarized
+        options["MOCK_IMPORTS"] = external_imports(tree, project=project)
+        log.info("Mocking imports: {}".format(options["MOCK_IMPORTS"]))
+
+    packages = None
+    if shard is not None:
+        packages = shard_packages(tree, *shard)
+        log.info("Shard {}/{} documents {} packages".format(
+            shard[0], shard[1], len(packages)))
+
+    extensions = list(fargs["EXTENSIONS"])
+    extra_artifacts = {}
+    if intersphinx:
+        options["INTERSPHINX_MAPPING"], extra_artifacts = \
+            generate_inventories(
+                source_dir, intersphinx, sink=sink, cache=InventoryCache(
+                    intersphinx_cache, ttl=intersphinx_ttl,
+                    offline=intersphinx_offline))
+        if INTERSPHINX_EXTENSION not in extensions:
+            extensions.append(INTERSPHINX_EXTENSION)
+
+    if build_timing:
+        options["TIMING_REPORT"] = build_timing
+        packages_file = join(source_dir, PACKAGES_FILENAME)
+        sink.write(packages_file, dumps(
+            [name for name, _ in package_names(tree)], indent=2))
+        extra_artifacts[packages_file] = False
+        extra_artifacts[join(source_dir, build_timing)] = False
+        if TIMING_EXTENSION not in extensions:
+            extensions.append(TIMING_EXTENSION)
+
+    if extensions != fargs["EXTENSIONS"]:
+        options["EXTENSIONS"] = extensions
+
+    symbols = None
+    if symbol_index:
+        symbols = SymbolIndex()
+        if SYMBOL_INDEX_DIR not in fargs["EXTRA_PATHS"]:
+            options["EXTRA_PATHS"] = fargs["EXTRA_PATHS"] + [SYMBOL_INDEX_DIR]
+
+    log.info("Generating templates")
+    main_templates = generate_sphinx(sink=sink, **options)
+    log.debug("Created the following files from templates: \n\t{}".format(
+              "\n\t".join(main_templates)))
+    artifacts = {temp: False for temp in main_templates}
+    artifacts.update(extra_artifacts)
+
+    artifacts.update(generate_rst(
+        tree, "{}/rst_docs".format(source_dir), sink=sink,
+        layout=page_layout, max_directives=max_page_directives,
+        max_bytes=max_page_bytes, packages=packages, cache=cache,
+        public_api=public_api, symbols=symbols, renderer=renderer))
+
+    if symbols is not None:
+        index_dir = join(source_dir, SYMBOL_INDEX_DIR, SYMBOL_OUTPUT_DIR)
+        manifest, previous = None, {}
+        if isinstance(sink, FileSystemSink):
+            manifest, previous = load_symbol_index(index_dir)
+        if packages is not None or changed_since is not None:
+            symbols.merge(previous)
+        symbols.write(index_dir, sink=sink, manifest=manifest)
+        artifacts[join(source_dir, SYMBOL_INDEX_DIR)] = False
+    artifacts.update(generate_docs_dir(
+        source_dir, fargs["BUILD_DIR"], sink=sink))
+
+    artifacts_file = log_artifacts(
+        source_dir, artifacts=artifacts, hide_file=hide_artifacts, sink=sink)
+
+    if cache is not None:
+        log.info("Cache hits: {}, misses: {}".format(cache.hits, cache.misses))
+        cache.prune()
+
+    if snapshot is not None:
+        snapshot.save(tree_snapshot, parser=parser)
+
+    parser.close()
+    _log_parse_report(parser)
+    return DocPlan(tree, sink, artifacts, artifacts_file)
+
+
+def version_dirname(version):
+    """Name of the directory of a version in the versioned layout.
+
+    :param version: Reference name of the version (e.g. a tag).
+    :return: Reference name with unsafe characters replaced.
+    """
+    return re.sub(r"[^\w.+-]", "_", version)
+
+
+def build_versions(versions, source=".", sink=None, hide_artifacts=False,
+                   cache_dir=None, cache_max_bytes=None, max_file_bytes=None,
+                   parse_timeout=None, **options):
+    """Generate the documentation of several versions of the project.
+    The sources of every version are read from the object database of the
+    git repository containing `source`, nothing is checked out. Every
+    blob is read from git and parsed once no matter how many versions
+    contain it (later versions copy the file written for the blob), and
+    the pages of packages that are unchanged between versions are rendered
+    once (see `templates.FragmentRenderer`).
+
+    Every version is generated in its own directory of `SOURCE_DIR` (see
+    `version_dirname`) next to the python files of that version, so that
+    autodoc imports the documented version. `versions.json` lists the
+    versions and their directories.
+
+    :param versions: References (tags, branches, commits) to document.
+    :param source: Directory of the project inside of the repository.
+    :param sink: OutputSink receiving the files. Defaults to a MemorySink.
+    :param hide_artifacts: When true, hide the artifacts files.
+    :param cache_dir: Directory of a (shared) content addressed cache for
+    the file summaries and rendered pages.
+    :param cache_max_bytes: Maximum size of the cache directory.
+    :param max_file_bytes: Source files larger than this are scanned
+    instead of parsed.
+    :param parse_timeout: Seconds a large source file may take to parse
+    before it is scanned instead.
+    :param options: See `build_plan`.
+    :return: Dictionary of version to DocPlan.
+    """
+    sink = sink or MemorySink()
+    fargs = check_args(**options)
+    source_dir = fargs["SOURCE_DIR"]
+
+    cache = None
+    if cache_dir is not None:
+        cache = ContentCache(cache_dir, max_bytes=cache_max_bytes)
+    parser = SourceParser(
+        cache=cache, max_bytes=max_file_bytes, time_budget=parse_timeout)
+
+    plans = {}
+    index = []
+    artifacts = {}
+    summaries = {}
+    # blob id to the first file written with its contents
+    written = {}
+    renderer = FragmentRenderer()
+    with GitRepository(source) as repository:
+        for version in versions:
+            blobs = {}
+            tree, files = git_tree(
+                repository, version, directory=source,
+                exclusions=fargs["EXCLUSIONS"], parser=parser,
+                summaries=summaries, blobs=blobs)
+
+            version_dir = join(source_dir, version_dirname(version))
+            version_options = dict(options)
+            version_options.update(
+                {"SOURCE_DIR": version_dir, "VERSION": version})
+            plans[version] = build_plan(
+                source, sink=sink, hide_artifacts=hide_artifacts,
+                cache_dir=cache_dir, cache_max_bytes=cache_max_bytes,
+                tree=tree, renderer=renderer, **version_options)
+
+            # autodoc imports the package from the version directory
+            for path, object_id in sorted(files.items()):
+                filename = join(version_dir, path)
+                sink.makedirs(dirname(filename))
+                if object_id in written:
+                    sink.copy(written[object_id], filename)
+                else:
+                    sink.write(filename, blobs.pop(object_id))
+                    written[object_id] = filename
+
+            artifacts[version_dir] = False
+            index.append({"version": version, "path": version_dirname(
+                version), "commit": repository.resolve(version)})
+
+        log.info("Read {} blobs, parsed {} distinct files for {} versions"
+                 .format(repository.blobs_read, len(summaries),
+                         len(versions)))
+
+    index_file = join(source_dir, "versions.json")
+    sink.write(index_file, dumps(index, indent=2))
+    artifacts[index_file] = False
+    log_artifacts(
+        source_dir, artifacts=artifacts, hide_file=hide_artifacts, sink=sink)
+
+    parser.close()
+    _log_parse_report(parser)
+    return plans
@@ -79,8 +79,14 @@ def check_args(*args, **kwargs):
     :param EXCLUSIONS: Path(s) and patterns of files to exclude from docs.
     :param THEME: The theme to use for HTML and HTML Help pages.
     :param STATIC_PATHS: Path(s) that contain custom static files.
+    :param EXTRA_PATHS: Path(s) copied to the root of the HTML output.
     :param SOURCE_DIR: Directory for the source of the software package.
     :param BUILD_DIR: Directory where the sphinx build will occur.
+    :param MOCK_IMPORTS: Modules that autodoc mocks instead of importing.
+    :param INTERSPHINX_MAPPING: Dictionary of project name to URL and
+    local inventory.
+    :param TIMING_REPORT: File (relative to `SOURCE_DIR`) of the per page
+    build timing report, see `timing`.
 
     :return: dictionary formatted with the arguments above, if they did not
     exist in `kwargs`, defaults will be applied.
@@ -91,6 +97,8 @@ def check_args(*args, **kwargs):
     templates = list_arg_format(kwargs.get("TEMPLATES", []), str)
     exclusions = list_arg_format(kwargs.get("EXCLUSIONS", []), str)
     static_paths = list_arg_format(kwargs.get("STATIC_PATHS", []), str)
+    extra_paths = list_arg_format(kwargs.get("EXTRA_PATHS", []), str)
+    mock_imports = list_arg_format(kwargs.get("MOCK_IMPORTS") or [], str)
 
     return {
         "PROJECT": simple_arg_format(kwargs.get("PROJECT", ""), str, ""),
@@ -105,8 +113,14 @@ def check_args(*args, **kwargs):
         "EXCLUSIONS": exclusions,
         "THEME": simple_arg_format(kwargs.get("THEME", ""), str, ""),
         "STATIC_PATHS": static_paths,
+        "EXTRA_PATHS": extra_paths,
         "SOURCE_DIR": simple_arg_format(
           kwargs.get("SOURCE_DIR", "."), str, "."),
         "BUILD_DIR": simple_arg_format(
-          kwargs.get("BUILD_DIR", "docs"), str, "docs")
+          kwargs.get("BUILD_DIR", "docs"), str, "docs"),
+        "MOCK_IMPORTS": mock_imports,
+        "INTERSPHINX_MAPPING": simple_arg_format(
+          kwargs.get("INTERSPHINX_MAPPING", {}), dict, {}),
+        "TIMING_REPORT": simple_arg_format(
+          kwargs.get("TIMING_REPORT", ""), str, "")
     }
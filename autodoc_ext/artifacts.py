@@ -4,13 +4,15 @@ from yaml import dump, safe_load
 from os.path import exists, isdir
 from shutil import rmtree
 from os import remove
+from .sinks import FileSystemSink
+from .events import timed
 
 
 log = getLogger()
 ARTIFACTS_FILENAME = "autodoc_ext_artifacts.yaml"
 
 
-def log_artifacts(source_dir, artifacts, hide_file=True):
+def log_artifacts(source_dir, artifacts, hide_file=True, sink=None):
     """
     Create build process logs/artifacts that will be used for during the
     destruction/cleanup process. The name of the file will be
@@ -19,13 +21,50 @@ def log_artifacts(source_dir, artifacts, hide_file=True):
     :param source_dir: Source directory where the artifaces file will reside.
     :param artifacts: Dictionary of created artifacts.
     :param hide_file: When true [default], hide the artifacts file.
+    :param sink: OutputSink receiving the file. Defaults to the filesystem.
+    :return: name/path of the artifacts file
     """
     filename = "."+ARTIFACTS_FILENAME if hide_file else ARTIFACTS_FILENAME
     artifact_file = join(source_dir, filename)
     log.info("Creating artifacts file: {}".format(artifact_file))
     
-    with open(artifact_file, 'w+') as yaml_artifacts:
-        dump(artifacts, yaml_artifacts)
+    (sink or FileSystemSink()).write(artifact_file, dump(artifacts))
+    return artifact_file
+
+
+def artifacts_filename(source_dir):
+    """Find the artifacts file (hidden or not) of a source directory.
+
+    :param source_dir: Source directory where the artifacts file resides.
+    :return: name/path of the artifacts file, None when not found.
+    """
+    for filename in (ARTIFACTS_FILENAME, "."+ARTIFACTS_FILENAME):
+        full_filename = join(source_dir, filename)
+        if exists(full_filename):
+            return full_filename
+    return None
+
+
+def update_artifacts(source_dir, artifacts):
+    """Add artifacts that were created after the generation (e.g. during
+    the build) to the existing artifacts file.
+
+    :param source_dir: Source directory where the artifacts file resides.
+    :param artifacts: Dictionary of created artifacts.
+    :return: name/path of the artifacts file, None when not found.
+    """
+    filename = artifacts_filename(source_dir)
+    if filename is None:
+        log.error("Failed to find artifacts file in {}".format(source_dir))
+        return None
+
+    with open(filename, "r") as yaml_file:
+        logged = safe_load(yaml_file) or {}
+    logged.update(artifacts)
+    log.info("Updating artifacts file: {}".format(filename))
+    with open(filename, "w+") as yaml_file:
+        yaml_file.write(dump(logged))
+    return filename
 
 
 def destroy(source_dir):
@@ -38,30 +77,33 @@ def destroy(source_dir):
     :return: True when the data was successfully removed, false otherwise
     """
 
-    filename = join(source_dir, ARTIFACTS_FILENAME)
-    if not exists(filename):
-        filename = join(source_dir, "."+ARTIFACTS_FILENAME)
-        if not exists(filename):
-            log.error(
-                "Failed to find artifacts file in {}".format(source_dir))
-            return
+    filename = artifacts_filename(source_dir)
+    if filename is None:
+        log.error(
+            "Failed to find artifacts file in {}".format(source_dir))
+        return
     
     with open(filename, "r") as yaml_file:
         artifacts = safe_load(yaml_file)
     
-    for fname, keep in artifacts.items():
-        if not exists(fname):
-            log.warning("Could not find: {}, skipping ...".format(fname))
-            continue
-        
-        if isdir(fname) and not keep:
-            log.debug("Removing dir {}".format(fname))
-            rmtree(fname)
-        elif not keep:
-            log.debug("Removing file {}".format(fname))
-            remove(fname)
-        else:
-            log.info("Keeping {}".format(fname))
+    with timed("destroy", source_dir=source_dir) as event:
+        removed = 0
+        for fname, keep in artifacts.items():
+            if not exists(fname):
+                log.warning("Could not find: {}, skipping ...".format(fname))
+                continue
+            
+            if isdir(fname) and not keep:
+                log.debug("Removing dir {}".format(fname))
+                rmtree(fname)
+                removed += 1
+            elif not keep:
+                log.debug("Removing file {}".format(fname))
+                remove(fname)
+                removed += 1
+            else:
+                log.info("Keeping {}".format(fname))
+        event["removed"] = removed
     
     log.debug("Removing artifact file ...")
     if exists(filename):
@@ -0,0 +1,143 @@
+import os
+import hashlib
+import tempfile
+from json import dumps, loads
+from logging import getLogger
+from .events import emit
+
+
+log = getLogger()
+
+
+def content_key(*parts):
+    """Create the key of a cache entry from its inputs.
+
+    :param parts: strings or bytes that identify the entry.
+    :return: sha256 hex digest of the parts.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode("utf-8")
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class ContentCache:
+    """Content addressed store in a directory that can be shared by several
+    processes (and hosts). Entries are grouped in namespaces and written
+    to a temporary file that is atomically renamed into place, so no
+    locks are required: writers of the same key produce the same content.
+    Every hit refreshes the modification time of the entry, and `prune`
+    evicts the least recently used entries once the store grows past
+    `max_bytes`.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        """Initialize the instance of a ContentCache
+
+        :param directory: Directory of the store.
+        :param max_bytes: Maximum size of the store. Defaults to None
+        (unbounded).
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, namespace, key):
+        """Filename of an entry."""
+        return os.path.join(self.directory, namespace, key[:2], key[2:])
+
+    def get(self, namespace, key):
+        """Read an entry from the store.
+
+        :param namespace: Group of the entry (e.g. `summaries`, `pages`).
+        :param key: Key of the entry, see `content_key`.
+        :return: bytes of the entry, None when not found.
+        """
+        path = self._path(namespace, key)
+        try:
+            with open(path, "rb") as entry:
+                data = entry.read()
+        except (IOError, OSError):
+            self.misses += 1
+            emit("cache.miss", namespace=namespace)
+            return None
+
+        self.hits += 1
+        emit("cache.hit", namespace=namespace)
+        try:
+            os.utime(path, None)
+        except OSError:
+            # evicted by another process in the meantime
+            pass
+        return data
+
+    def put(self, namespace, key, data):
+        """Write an entry to the store.
+
+        :param namespace: Group of the entry (e.g. `summaries`, `pages`).
+        :param key: Key of the entry, see `content_key`.
+        :param data: bytes of the entry.
+        """
+        path = self._path(namespace, key)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            handle, temp_name = tempfile.mkstemp(dir=directory, prefix=".tmp")
+            with os.fdopen(handle, "wb") as entry:
+                entry.write(data)
+            os.replace(temp_name, path)
+        except (IOError, OSError) as error:
+            log.warning("Failed to write cache entry {}: {}".format(
+                path, error))
+
+    def get_json(self, namespace, key):
+        """Read a JSON entry from the store.
+
+        :return: Deserialized entry, None when not found.
+        """
+        data = self.get(namespace, key)
+        return loads(data.decode("utf-8")) if data is not None else None
+
+    def put_json(self, namespace, key, value):
+        """Write a JSON serializable entry to the store."""
+        self.put(namespace, key, dumps(value).encode("utf-8"))
+
+    def prune(self):
+        """Evict the least recently used entries until the store is no
+        larger than `max_bytes`.
+
+        :return: Number of entries that were removed.
+        """
+        if self.max_bytes is None or not os.path.isdir(self.directory):
+            return 0
+
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+                total += stat.st_size
+
+        removed = 0
+        for _, path, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+            total -= size
+
+        log.info("Removed {} entries from the cache {}".format(
+            removed, self.directory))
+        return removed
@@ -0,0 +1,151 @@
+import os
+import gzip
+import tempfile
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+
+
+log = getLogger()
+
+# Extensions of the built files that are worth compressing (text formats)
+COMPRESSIBLE_EXTENSIONS = (
+    ".html", ".htm", ".css", ".js", ".json", ".svg", ".txt", ".xml",
+    ".map", ".ttf", ".otf", ".eot", ".ico"
+)
+
+# Files smaller than this are not compressed, the savings do not make up
+# for the extra request headers
+MIN_COMPRESS_BYTES = 256
+
+# Extension of the sibling created for each format
+COMPRESS_FORMATS = {"gz": ".gz", "br": ".br"}
+
+
+def _gzip(data):
+    """Compress data in the gzip format. The timestamp of the header is
+    zeroed so the same input always produces the same output.
+
+    :param data: bytes to compress.
+    :return: Compressed bytes.
+    """
+    output = BytesIO()
+    with gzip.GzipFile(fileobj=output, mode="wb", compresslevel=9,
+                       mtime=0) as compressed:
+        compressed.write(data)
+    return output.getvalue()
+
+
+def _compressors(formats):
+    """Get the compression function of every format. Brotli requires the
+    `brotli` package, the format is skipped when it is not installed.
+
+    :param formats: Names of the formats, see `COMPRESS_FORMATS`.
+    :return: Dictionary of sibling extension to compression function.
+    """
+    compressors = {}
+    for name in formats:
+        if name not in COMPRESS_FORMATS:
+            raise ValueError("Unknown compression format: {}".format(name))
+        if name == "gz":
+            compressors[COMPRESS_FORMATS[name]] = _gzip
+        elif name == "br":
+            try:
+                import brotli
+            except ImportError:
+                log.warning(
+                    "The brotli package is not installed, skipping .br ...")
+                continue
+            compressors[COMPRESS_FORMATS[name]] = brotli.compress
+    return compressors
+
+
+def _write_sibling(filename, data, stat):
+    """Atomically write a compressed sibling. The sibling receives the
+    modification time of the original file, which marks it up to date.
+
+    :param filename: Name of the sibling.
+    :param data: Compressed bytes.
+    :param stat: os.stat_result of the original file.
+    """
+    handle, temp_name = tempfile.mkstemp(
+        dir=os.path.dirname(filename), prefix=".tmp")
+    with os.fdopen(handle, "wb") as sibling:
+        sibling.write(data)
+    os.chmod(temp_name, 0o644)
+    os.utime(temp_name, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(temp_name, filename)
+
+
+def _compress_file(filename, compressors):
+    """Create the compressed siblings of a single file. Siblings with the
+    same modification time as the file are up to date and kept.
+
+    :param filename: Name of the file.
+    :param compressors: See `_compressors`.
+    :return: Tuple of the siblings of the file and the number of
+    siblings that were written.
+    """
+    stat = os.stat(filename)
+    siblings = []
+    written = 0
+    data = None
+    for extension, compress in sorted(compressors.items()):
+        sibling = filename + extension
+        try:
+            current = os.stat(sibling).st_mtime_ns == stat.st_mtime_ns
+        except OSError:
+            current = False
+        if not current:
+            if data is None:
+                with open(filename, "rb") as original:
+                    data = original.read()
+            compressed = compress(data)
+            if len(compressed) >= len(data):
+                log.debug("{} does not compress, skipping ...".format(
+                    sibling))
+                if os.path.exists(sibling):
+                    os.remove(sibling)
+                continue
+            _write_sibling(sibling, compressed, stat)
+            written += 1
+        siblings.append(sibling)
+    return siblings, written
+
+
+def precompress(directory, formats=("gz", "br"), workers=None):
+    """Write compressed siblings (`.gz`, `.br`) of the compressible files
+    of a built site, so static servers can send them without compressing
+    on every request. Files are compressed in parallel (zlib and brotli
+    release the GIL), siblings that are up to date are skipped.
+
+    :param directory: Directory of the built site.
+    :param formats: Names of the formats, see `COMPRESS_FORMATS`.
+    :param workers: Number of threads. Defaults to the number of CPUs.
+    :return: Sorted list of all compressed siblings in the directory.
+    """
+    compressors = _compressors(formats)
+    filenames = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(files):
+            full_filename = os.path.join(root, filename)
+            if not filename.lower().endswith(COMPRESSIBLE_EXTENSIONS) or \
+                    os.path.islink(full_filename):
+                continue
+            if os.path.getsize(full_filename) < MIN_COMPRESS_BYTES:
+                continue
+            filenames.append(full_filename)
+
+    siblings = []
+    written = 0
+    if compressors and filenames:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            for file_siblings, file_written in pool.map(
+                    lambda x: _compress_file(x, compressors), filenames):
+                siblings.extend(file_siblings)
+                written += file_written
+
+    log.info("Wrote {} compressed files in {}, {} were up to date".format(
+        written, directory, len(siblings) - written))
+    return sorted(siblings)
@@ -0,0 +1,76 @@
+from logging import getLogger
+from contextlib import contextmanager
+import time
+
+
+log = getLogger()
+
+# Events that are emitted by the application with their payload:
+# - tree.walk:   path, files, directories, seconds (one per directory)
+# - file.parse:  filename, bytes, seconds (when a file is summarized)
+# - page.render: package, pages, seconds
+# - rst.write:   filename, bytes
+# - cache.hit:   namespace
+# - cache.miss:  namespace
+# - destroy:     source_dir, removed, seconds
+EVENTS = (
+    "tree.walk", "file.parse", "page.render", "rst.write",
+    "cache.hit", "cache.miss", "destroy"
+)
+
+# Subscribe to this name to receive every event
+ALL_EVENTS = "*"
+
+_subscribers = {}
+
+
+def subscribe(event, callback):
+    """Register a callback for an event. The callback receives the name of
+    the event and the payload dictionary.
+
+    :param event: Name of the event (see `EVENTS`) or `ALL_EVENTS`.
+    :param callback: Function accepting (event, payload).
+    """
+    _subscribers.setdefault(event, []).append(callback)
+
+
+def unsubscribe(event, callback):
+    """Remove a callback that was registered with `subscribe`.
+
+    :param event: Name of the event (see `EVENTS`) or `ALL_EVENTS`.
+    :param callback: Function that was registered.
+    """
+    callbacks = _subscribers.get(event, [])
+    if callback in callbacks:
+        callbacks.remove(callback)
+
+
+def emit(event, **payload):
+    """Send an event to all subscribers. Errors raised by subscribers are
+    logged and never interrupt the generation.
+
+    :param event: Name of the event.
+    :param payload: Data of the event.
+    """
+    callbacks = _subscribers.get(event, []) + _subscribers.get(ALL_EVENTS, [])
+    for callback in callbacks:
+        try:
+            callback(event, payload)
+        except Exception as error:
+            log.warning("Subscriber of {} failed: {}".format(event, error))
+
+
+@contextmanager
+def timed(event, **payload):
+    """Emit an event with the duration (`seconds`) of the block. Values can
+    be added to the yielded payload inside the block.
+
+    :param event: Name of the event.
+    :param payload: Data of the event.
+    """
+    start = time.perf_counter()
+    try:
+        yield payload
+    finally:
+        payload["seconds"] = time.perf_counter() - start
+        emit(event, **payload)
@@ -0,0 +1,184 @@
+import os
+import re
+import time
+import tempfile
+from logging import getLogger
+from urllib.request import urlopen
+from .sinks import FileSystemSink
+
+
+log = getLogger()
+
+# Name of the sphinx extension that reads the inventories
+INTERSPHINX_EXTENSION = "sphinx.ext.intersphinx"
+
+# Directory of the inventories in SOURCE_DIR
+INVENTORY_DIR = "_intersphinx"
+
+# Seconds before a cached inventory is fetched again
+DEFAULT_TTL = 24 * 60 * 60
+
+# Seconds to wait for a server before the cached inventory is used
+FETCH_TIMEOUT = 10
+
+
+def default_cache_dir():
+    """Directory of the inventory cache shared by all projects of the
+    user (`$XDG_CACHE_HOME/autodoc_ext/intersphinx`).
+
+    :return: Path of the directory.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "autodoc_ext", "intersphinx")
+
+
+def inventory_filename(name):
+    """Filename of the inventory of a project.
+
+    :param name: Name of the project in the intersphinx mapping.
+    :return: Name with unsafe characters replaced and the `.inv` extension.
+    """
+    return re.sub(r"[^\w.-]", "_", name) + ".inv"
+
+
+def parse_intersphinx(value):
+    """Parse an inventory specification in the form `NAME=URL` or
+    `NAME=URL=INVENTORY`, where INVENTORY is a local `objects.inv` file
+    (or URL) to import instead of `URL/objects.inv`.
+
+    :param value: Inventory specification string.
+    :return: Tuple of name, URL and inventory (None when not provided).
+    """
+    parts = value.split("=", 2)
+    if len(parts) < 2 or not parts[0] or not parts[1]:
+        raise ValueError(
+            "Inventory must be formatted as NAME=URL[=INVENTORY]: {}".format(
+                value))
+    return parts[0], parts[1], parts[2] if len(parts) > 2 else None
+
+
+class InventoryCache:
+    """Local store of intersphinx inventories (`objects.inv`). Inventories
+    are fetched once and refreshed after `ttl` seconds when the server can
+    be reached; when it can not, the cached inventory is used no matter
+    its age and the next refresh is attempted after another `ttl` seconds.
+    Sphinx then reads the inventories from local files and never waits on
+    the network.
+    """
+
+    def __init__(self, directory=None, ttl=DEFAULT_TTL,
+                 timeout=FETCH_TIMEOUT, offline=False):
+        """Initialize the instance of an InventoryCache
+
+        :param directory: Directory of the cache. Defaults to
+        `default_cache_dir`.
+        :param ttl: Seconds before a cached inventory is fetched again.
+        :param timeout: Seconds to wait for a server.
+        :param offline: When true, inventories are never fetched from a
+        URL. Cached inventories are used no matter their age.
+        """
+        self.directory = directory or default_cache_dir()
+        self.ttl = ttl
+        self.timeout = timeout
+        self.offline = offline
+
+    def _path(self, name):
+        """Filename of the cached inventory of a project."""
+        return os.path.join(self.directory, inventory_filename(name))
+
+    def _read(self, location):
+        """Read an inventory from a URL or a local file.
+
+        :param location: URL or filename of the inventory.
+        :return: bytes of the inventory.
+        """
+        if "://" in location:
+            log.info("Fetching {}".format(location))
+            with urlopen(location, timeout=self.timeout) as response:
+                return response.read()
+        with open(location, "rb") as inventory:
+            return inventory.read()
+
+    def _store(self, path, data):
+        """Atomically write an inventory to the cache."""
+        os.makedirs(self.directory, exist_ok=True)
+        handle, temp_name = tempfile.mkstemp(
+            dir=self.directory, prefix=".tmp")
+        with os.fdopen(handle, "wb") as inventory:
+            inventory.write(data)
+        os.replace(temp_name, path)
+
+    def get(self, name, url, inventory=None):
+        """Get the inventory of a project, fetching it when it is not
+        cached or older than the ttl. Local inventory files are imported
+        on every call.
+
+        :param name: Name of the project in the intersphinx mapping.
+        :param url: Base URL of the documentation of the project.
+        :param inventory: Local file (or URL) of the inventory, imported
+        instead of `url/objects.inv`.
+        :return: bytes of the inventory, None when it is not available.
+        """
+        path = self._path(name)
+        try:
+            age = time.time() - os.stat(path).st_mtime
+        except OSError:
+            age = None
+
+        location = inventory or url.rstrip("/") + "/objects.inv"
+        if self.offline and "://" in location:
+            if age is None:
+                log.warning("Inventory {} is not cached, skipping "
+                            "...".format(name))
+                return None
+            log.debug("Offline, using the cached inventory {}".format(name))
+        elif "://" in location and age is not None and age < self.ttl:
+            log.debug("Inventory {} is cached".format(name))
+        else:
+            try:
+                self._store(path, self._read(location))
+            except (IOError, OSError, ValueError) as error:
+                if age is None:
+                    log.warning(
+                        "Inventory {} is not available ({}), skipping "
+                        "...".format(name, error))
+                    return None
+                log.warning("Failed to refresh inventory {} ({}), using "
+                            "the cached copy".format(name, error))
+                # record the attempt, the next one waits for the ttl
+                os.utime(path, None)
+
+        with open(path, "rb") as cached:
+            return cached.read()
+
+
+def generate_inventories(source_dir, inventories, cache=None, sink=None):
+    """Write the inventories of the intersphinx mapping to the source
+    directory so sphinx reads them locally.
+
+    :param source_dir: Directory for the sphinx sources.
+    :param inventories: List of tuples of name, URL and inventory, see
+    `parse_intersphinx`.
+    :param cache: InventoryCache. Defaults to the cache in
+    `default_cache_dir`.
+    :param sink: OutputSink receiving the files. Defaults to the filesystem.
+    :return: Tuple of the intersphinx mapping (name to URL and inventory
+    path relative to `source_dir`) and the dictionary of artifacts.
+    """
+    cache = cache or InventoryCache()
+    sink = sink or FileSystemSink()
+    directory = os.path.join(source_dir, INVENTORY_DIR)
+    mapping = {}
+    artifacts = {}
+    for name, url, inventory in inventories:
+        data = cache.get(name, url, inventory)
+        if data is None:
+            continue
+        if not artifacts:
+            sink.makedirs(directory)
+            artifacts[directory] = False
+        filename = inventory_filename(name)
+        sink.write(os.path.join(directory, filename), data)
+        mapping[name] = (url, "{}/{}".format(INVENTORY_DIR, filename))
+    return mapping, artifacts
@@ -0,0 +1,171 @@
+import os
+import tempfile
+import threading
+from logging import getLogger
+from .events import subscribe, unsubscribe, ALL_EVENTS
+
+
+log = getLogger()
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus format."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Initialize the instance of a Histogram
+
+        :param buckets: Upper bounds of the buckets.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Add a value to the histogram.
+
+        :param value: Observed value.
+        """
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class PrometheusExporter:
+    """Collect the events of the application (see `events.EVENTS`) into
+    counters and histograms, and write them in the Prometheus textfile
+    format (for the node_exporter textfile collector). Events may be
+    emitted from several threads (e.g. the walk workers).
+    """
+
+    COUNTERS = {
+        "directories_walked_total": "Directories listed while walking",
+        "files_walked_total": "Python files found while walking",
+        "files_parsed_total": "Source files that were parsed",
+        "bytes_parsed_total": "Bytes of source files that were parsed",
+        "pages_rendered_total": "Rendered rst pages",
+        "pages_written_total": "Written rst pages",
+        "bytes_written_total": "Bytes of written rst pages",
+        "cache_hits_total": "Cache hits by namespace",
+        "cache_misses_total": "Cache misses by namespace",
+        "artifacts_removed_total": "Artifacts removed by clean",
+    }
+
+    HISTOGRAMS = {
+        "walk_seconds": "Time to list a directory",
+        "parse_seconds": "Time to parse a source file",
+        "render_seconds": "Time to render the pages of a package",
+        "destroy_seconds": "Time to remove the artifacts",
+    }
+
+    def __init__(self, prefix="autodoc_ext"):
+        """Initialize the instance of a PrometheusExporter
+
+        :param prefix: Prefix of all metric names.
+        """
+        self.prefix = prefix
+        # counter name -> {label value (or None): value}
+        self.counters = {name: {} for name in self.COUNTERS}
+        self.histograms = {name: Histogram() for name in self.HISTOGRAMS}
+        self._lock = threading.Lock()
+
+    def attach(self):
+        """Start receiving events."""
+        subscribe(ALL_EVENTS, self.handle)
+        return self
+
+    def detach(self):
+        """Stop receiving events."""
+        unsubscribe(ALL_EVENTS, self.handle)
+
+    def _inc(self, name, value=1, label=None):
+        """Increment a counter."""
+        self.counters[name][label] = self.counters[name].get(label, 0) + value
+
+    def handle(self, event, payload):
+        """Update the metrics from an event.
+
+        :param event: Name of the event.
+        :param payload: Data of the event.
+        """
+        with self._lock:
+            self._update(event, payload)
+
+    def _update(self, event, payload):
+        """Update the metrics from an event, the lock is held."""
+        if event == "tree.walk":
+            self._inc("directories_walked_total")
+            self._inc("files_walked_total", payload.get("files", 0))
+            self.histograms["walk_seconds"].observe(payload["seconds"])
+        elif event == "file.parse":
+            self._inc("files_parsed_total")
+            self._inc("bytes_parsed_total", payload.get("bytes", 0))
+            self.histograms["parse_seconds"].observe(payload["seconds"])
+        elif event == "page.render":
+            self._inc("pages_rendered_total", payload.get("pages", 1))
+            self.histograms["render_seconds"].observe(payload["seconds"])
+        elif event == "rst.write":
+            self._inc("pages_written_total")
+            self._inc("bytes_written_total", payload.get("bytes", 0))
+        elif event == "cache.hit":
+            self._inc("cache_hits_total", label=payload.get("namespace"))
+        elif event == "cache.miss":
+            self._inc("cache_misses_total", label=payload.get("namespace"))
+        elif event == "destroy":
+            self._inc("artifacts_removed_total", payload.get("removed", 0))
+            self.histograms["destroy_seconds"].observe(payload["seconds"])
+
+    def render(self):
+        """Format all metrics in the Prometheus text format.
+
+        :return: String of the metrics.
+        """
+        with self._lock:
+            return self._render()
+
+    def _render(self):
+        """Format all metrics, the lock is held."""
+        lines = []
+        for name in sorted(self.counters):
+            full_name = "{}_{}".format(self.prefix, name)
+            lines.append("# HELP {} {}".format(full_name, self.COUNTERS[name]))
+            lines.append("# TYPE {} counter".format(full_name))
+            values = self.counters[name] or {None: 0}
+            for label in sorted(values, key=lambda x: x or ""):
+                labels = '{{namespace="{}"}}'.format(label) if label else ""
+                lines.append("{}{} {}".format(
+                    full_name, labels, values[label]))
+
+        for name in sorted(self.histograms):
+            histogram = self.histograms[name]
+            full_name = "{}_{}".format(self.prefix, name)
+            lines.append("# HELP {} {}".format(
+                full_name, self.HISTOGRAMS[name]))
+            lines.append("# TYPE {} histogram".format(full_name))
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append('{}_bucket{{le="{}"}} {}'.format(
+                    full_name, bound, count))
+            lines.append('{}_bucket{{le="+Inf"}} {}'.format(
+                full_name, histogram.count))
+            lines.append("{}_sum {}".format(full_name, histogram.sum))
+            lines.append("{}_count {}".format(full_name, histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename):
+        """Atomically write the metrics to a textfile. The collector never
+        reads a partially written file.
+
+        :param filename: Name of the textfile (should end with `.prom`).
+        """
+        directory = os.path.dirname(os.path.abspath(filename))
+        handle, temp_name = tempfile.mkstemp(dir=directory, prefix=".tmp")
+        with os.fdopen(handle, "w") as textfile:
+            textfile.write(self.render())
+        os.chmod(temp_name, 0o644)
+        os.replace(temp_name, filename)
+        log.info("Metrics written to {}".format(filename))
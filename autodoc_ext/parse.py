@@ -0,0 +1,485 @@
+import os
+import re
+import ast
+import mmap
+import hashlib
+import tokenize
+import multiprocessing
+from logging import getLogger
+from .cache import content_key
+from .events import timed
+
+
+log = getLogger()
+
+# Files of at least this size are memory mapped instead of read
+MMAP_THRESHOLD = 1024 * 1024
+
+# A file without any of these keywords can not define a class or
+# function, import a module, export names or have a docstring
+SCAN_KEYWORDS = (b"class", b"def", b"import", b"__all__", b'"""', b"'''")
+
+# Version of the summary layout, part of the keys of cached summaries
+SUMMARY_VERSION = 3
+
+# Number of file stats kept by a parser. Once exceeded, only the slowest
+# and the largest files are kept (see `SourceParser.report`).
+MAX_STATS = 1000
+
+# With a parse time budget, files of at least this size are parsed in a
+# separate process that is stopped once the budget is exhausted
+ISOLATE_THRESHOLD = 256 * 1024
+
+# Patterns of the fallback scan for files that are not parsed
+CLASS_PATTERN = re.compile(rb"^[ \t]*class[ \t]+([A-Za-z_]\w*)", re.MULTILINE)
+IMPORT_PATTERN = re.compile(
+    rb"^(?:import|from)[ \t]+([A-Za-z_]\w*)", re.MULTILINE)
+DEFINITION_PATTERN = re.compile(
+    rb"^(?:async[ \t]+)?(class|def)[ \t]+([A-Za-z_]\w*)", re.MULTILINE)
+
+# Kind of the top level definitions by keyword of the fallback scan
+DEFINITION_KINDS = {b"class": "class", b"def": "function"}
+
+
+class SourceParser:
+    """Parse python source files into summaries. A summary is a plain
+    dictionary (so that it can be serialized) describing the contents of
+    a single file:
+
+    - classes: names of all classes found in the file
+    - imports: top level names of the absolute imports that are executed
+      when the module is imported (imports inside functions are ignored)
+    - definitions: name and kind (`class` or `function`) of the classes
+      and functions defined at the top level of the module, in order
+    - exports: names listed in `__all__`, None when the module does not
+      define `__all__` (or it can not be determined without running it)
+    - docstring: first line of the docstring of the module
+    - docstrings: first line of the docstring of every top level
+      definition that has one, by name
+
+    Summaries are memoized by filename, size and modification time so
+    that every file is parsed once, no matter how often the tree is
+    queried. Files are read as bytes so that `ast.parse` detects the
+    encoding (PEP 263 cookies and BOMs); large files are memory mapped
+    and files without any `SCAN_KEYWORDS` are never parsed. When a
+    `cache.ContentCache` is provided, summaries are shared through it,
+    keyed by the hash of the file contents.
+
+    Files larger than `max_bytes`, and files that can not be parsed within
+    `time_budget` seconds, are summarized by a cheap scan instead (the
+    summary contains `fallback`). The size and parse time of the files
+    are recorded (the slowest and largest `MAX_STATS`), see `report`.
+    """
+
+    def __init__(self, cache=None, max_bytes=None, time_budget=None):
+        """Initialize the instance of a SourceParser
+
+        :param cache: ContentCache for the summaries. Defaults to None.
+        :param max_bytes: Files larger than this are scanned instead of
+        parsed. Defaults to None (no limit).
+        :param time_budget: Seconds a file (of at least ISOLATE_THRESHOLD
+        bytes) may take to parse before it is scanned instead. Defaults to
+        None (no limit).
+        """
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.time_budget = time_budget
+        self.stats = []
+        self._summaries = {}
+        self._pool = None
+
+    def summary(self, filename):
+        """Get the summary of a single source file.
+
+        :param filename: Full path of the python source file.
+        :return: Summary dictionary for the file.
+        """
+        stat = os.stat(filename)
+        key = (stat.st_size, stat.st_mtime_ns)
+        cached = self._summaries.get(filename)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        log.debug("Parsing {}".format(filename))
+        with timed("file.parse", filename=filename,
+                   bytes=stat.st_size) as event, \
+                open(filename, "rb") as file_handle:
+            if stat.st_size == 0:
+                summary = self.empty_summary()
+            elif stat.st_size >= MMAP_THRESHOLD:
+                with mmap.mmap(file_handle.fileno(), 0,
+                               access=mmap.ACCESS_READ) as mapped:
+                    summary = self._cached_summary(filename, mapped)
+            else:
+                summary = self._cached_summary(filename, file_handle.read())
+        self._summaries[filename] = (key, summary)
+        self._record(filename, stat.st_size, event["seconds"], summary)
+        return summary
+
+    def summary_of(self, filename, data):
+        """Get the summary of source code that is not read from the
+        filesystem (e.g. a blob of a git repository). The summary is not
+        memoized by filename, the cache is still used.
+
+        :param filename: Name of the source, used in logs and stats.
+        :param data: bytes of the source file.
+        :return: Summary dictionary for the data.
+        """
+        log.debug("Parsing {}".format(filename))
+        with timed("file.parse", filename=filename, bytes=len(data)) as event:
+            if not data:
+                summary = self.empty_summary()
+            else:
+                summary = self._cached_summary(filename, data)
+        self._record(filename, len(data), event["seconds"], summary)
+        return summary
+
+    def _record(self, filename, size, seconds, summary):
+        """Record the stats of a summarized file, see `report`."""
+        self.stats.append({
+            "filename": filename,
+            "bytes": size,
+            "seconds": seconds,
+            "fallback": summary.get("fallback", False)
+        })
+        if len(self.stats) > MAX_STATS:
+            report = self.report(MAX_STATS // 4)
+            kept = {id(stat) for stat in report["slowest"] + report["largest"]}
+            self.stats = [stat for stat in self.stats if id(stat) in kept]
+
+    def _cached_summary(self, filename, data):
+        """Get the summary of the data from the cache, summarize and store
+        the data when it is not cached. Files over the size limit are
+        always scanned.
+
+        :param filename: Full path of the python source file.
+        :param data: bytes or mmap of the source file.
+        :return: Summary dictionary for the source code.
+        """
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            log.warning("{} is larger than {} bytes, scanning ...".format(
+                filename, self.max_bytes))
+            return self.scan(data)
+
+        if self.cache is None:
+            return self._scan_and_summarize(filename, data)
+
+        key = content_key(
+            "summary", SUMMARY_VERSION, hashlib.sha256(data).hexdigest())
+        summary = self.cache.get_json("summaries", key)
+        if summary is None:
+            summary = self._scan_and_summarize(filename, data)
+            if not summary.get("fallback"):
+                self.cache.put_json("summaries", key, summary)
+        return summary
+
+    def _scan_and_summarize(self, filename, data):
+        """Summarize the data when the pre-scan finds any keyword.
+
+        :param filename: Full path of the python source file.
+        :param data: bytes or mmap of the source file.
+        :return: Summary dictionary for the source code.
+        """
+        if not any(data.find(keyword) >= 0 for keyword in SCAN_KEYWORDS):
+            log.debug("  No keywords found, skipping parse ...")
+            return self.empty_summary()
+        if self.time_budget is not None and len(data) >= ISOLATE_THRESHOLD:
+            return self._summarize_within_budget(filename, data)
+        if isinstance(data, mmap.mmap):
+            data = _decode_mapping(data)
+        return self.summarize(data)
+
+    def _summarize_within_budget(self, filename, data):
+        """Parse the data in a separate process. When the parse does not
+        finish within the time budget the process is stopped and the data
+        is scanned instead. The memory used by the parse is released with
+        the process.
+
+        :param filename: Full path of the python source file.
+        :param data: bytes or mmap of the source file.
+        :return: Summary dictionary for the source code.
+        """
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(1)
+        result = self._pool.apply_async(_summarize, (data[:],))
+        try:
+            return result.get(self.time_budget)
+        except multiprocessing.TimeoutError:
+            log.warning("{} did not parse within {} seconds, scanning ...".format(
+                filename, self.time_budget))
+            self._pool.terminate()
+            self._pool = None
+            return self.scan(data)
+
+    @staticmethod
+    def scan(data):
+        """Summarize the data without parsing it. Classes, top level
+        imports and definitions are found with regular expressions, so the
+        result may contain classes defined inside of strings. `__all__` is
+        never determined.
+
+        :param data: bytes or mmap of the source file.
+        :return: Summary dictionary (with `fallback`) for the data.
+        """
+        return {
+            "classes": [
+                m.group(1).decode("ascii") for m in CLASS_PATTERN.finditer(data)
+            ],
+            "imports": sorted({
+                m.group(1).decode("ascii") for m in IMPORT_PATTERN.finditer(data)
+            }),
+            "definitions": [
+                [m.group(2).decode("ascii"), DEFINITION_KINDS[m.group(1)]]
+                for m in DEFINITION_PATTERN.finditer(data)
+            ],
+            "exports": None,
+            "docstring": "",
+            "docstrings": {},
+            "fallback": True
+        }
+
+    def report(self, count=5):
+        """Get the slowest and the largest files that were summarized.
+
+        :param count: Number of files in each list.
+        :return: Dictionary with the `slowest` and `largest` file stats.
+        """
+        return {
+            "slowest": sorted(
+                self.stats, key=lambda x: -x["seconds"])[:count],
+            "largest": sorted(
+                self.stats, key=lambda x: -x["bytes"])[:count],
+        }
+
+    def close(self):
+        """Stop the process used to parse within the time budget."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    @staticmethod
+    def empty_summary():
+        """Summary of a file that does not contain any definitions.
+
+        :return: Summary dictionary.
+        """
+        return {"classes": [], "imports": [], "definitions": [],
+                "exports": None, "docstring": "", "docstrings": {}}
+
+    @staticmethod
+    def summarize(source):
+        """Create the summary for the source code of a file.
+
+        :param source: Source code (bytes or string) of the file.
+        :return: Summary dictionary for the source code.
+        """
+        return _summarize(source)
+
+    def export_summaries(self):
+        """Get the memoized summaries in a serializable layout. Summaries
+        of scanned files are not exported, they depend on the limits.
+
+        :return: Dictionary of filename to a list of size, modification
+        time (ns) and summary.
+        """
+        return {
+            filename: [key[0], key[1], summary]
+            for filename, (key, summary) in self._summaries.items()
+            if not summary.get("fallback")
+        }
+
+    def import_summaries(self, summaries):
+        """Memoize the summaries of a previous run (see `export_summaries`).
+        A summary is used while the size and modification time of its file
+        are unchanged.
+
+        :param summaries: Dictionary of filename to a list of size,
+        modification time (ns) and summary.
+        """
+        for filename, (size, mtime_ns, summary) in summaries.items():
+            self._summaries.setdefault(filename, ((size, mtime_ns), summary))
+
+    def clear(self):
+        """Forget all memoized summaries and stats."""
+        self._summaries.clear()
+        self.stats = []
+
+
+def _decode_mapping(mapped):
+    """Decode a memory mapped source file straight into a string with the
+    encoding declared by the file (PEP 263 cookie or BOM), the mapping is
+    never copied into bytes.
+
+    :param mapped: mmap of the source file.
+    :return: Source code string.
+    """
+    mapped.seek(0)
+    encoding, _ = tokenize.detect_encoding(mapped.readline)
+    return str(mapped, encoding)
+
+
+def _summarize(source):
+    """Create the summary for the source code of a file (module level so
+    that it can run in a separate process).
+
+    :param source: Source code (bytes or string) of the file.
+    :return: Summary dictionary for the source code.
+    """
+    file_data = ast.parse(source)
+    definitions = _module_definitions(file_data)
+    docstrings = {}
+    for node, _ in definitions:
+        line = _first_line(node)
+        if line:
+            docstrings[node.name] = line
+    return {
+        "classes": [
+            str(found_cls.name) for found_cls in ast.walk(file_data)
+            if isinstance(found_cls, ast.ClassDef)
+        ],
+        "imports": _module_imports(file_data),
+        "definitions": [[node.name, kind] for node, kind in definitions],
+        "exports": _module_exports(file_data),
+        "docstring": _first_line(file_data),
+        "docstrings": docstrings
+    }
+
+
+def _module_imports(module):
+    """Find the top level names of the absolute imports that run when the
+    module is imported. Function bodies are skipped, everything else
+    (conditionals, try blocks, class bodies) is searched.
+
+    :param module: ast.Module of the source file.
+    :return: Sorted list of unique top level module names.
+    """
+    found = set()
+    stack = [module]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Import):
+            found.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if not node.level and node.module:
+                found.add(node.module.split(".")[0])
+        elif not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+                                   ast.Lambda)):
+            stack.extend(ast.iter_child_nodes(node))
+    return sorted(found)
+
+
+def public_names(summary):
+    """Get the names a module exports: the names of `__all__` when it is
+    defined, otherwise the top level classes and functions that do not
+    start with an underscore.
+
+    :param summary: Summary dictionary of the module.
+    :return: List of names, in order.
+    """
+    exports = summary.get("exports")
+    if exports is not None:
+        return list(exports)
+    return [
+        name for name, _ in summary.get("definitions", [])
+        if not name.startswith("_")
+    ]
+
+
+def _module_definitions(module):
+    """Find the classes and functions defined at the top level of the
+    module, including the definitions in top level conditionals and try
+    blocks. Nested classes and functions are ignored.
+
+    :param module: ast.Module of the source file.
+    :return: List of the ast node and kind (`class` or `function`) of
+    every definition, in order.
+    """
+    found = []
+    names = set()
+    stack = list(reversed(module.body))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.ClassDef):
+            kind = "class"
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            kind = "function"
+        else:
+            if isinstance(node, (ast.If, ast.Try)):
+                blocks = [node.body, node.orelse]
+                blocks.extend(h.body for h in getattr(node, "handlers", []))
+                blocks.append(getattr(node, "finalbody", []))
+                for block in reversed(blocks):
+                    stack.extend(reversed(block))
+            continue
+        if node.name not in names:
+            names.add(node.name)
+            found.append((node, kind))
+    return found
+
+
+def _first_line(node):
+    """Get the first line of the docstring of a module, class or function.
+
+    :param node: ast node.
+    :return: First line, stripped. Empty when there is no docstring.
+    """
+    docstring = ast.get_docstring(node)
+    return docstring.strip().split("\n")[0].strip() if docstring else ""
+
+
+def _string_list(node):
+    """Get the strings of a literal list or tuple of strings.
+
+    :param node: ast node of the value.
+    :return: List of strings, None when the value is not such a literal.
+    """
+    if not isinstance(node, (ast.List, ast.Tuple)):
+        return None
+    strings = []
+    for element in node.elts:
+        # ast.Str (python < 3.8) stores the string in `s`
+        value = getattr(element, "value", getattr(element, "s", None))
+        if not isinstance(value, str):
+            return None
+        strings.append(value)
+    return strings
+
+
+def _module_exports(module):
+    """Find the names listed in the `__all__` of the module. Literal
+    assignments and augmented assignments at the top level are followed;
+    any other use of `__all__` can not be determined statically.
+
+    :param module: ast.Module of the source file.
+    :return: List of unique names in order, None when `__all__` is not
+    defined or not a literal.
+    """
+    exports = None
+    for node in module.body:
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, (ast.AnnAssign, ast.AugAssign)):
+            targets = [node.target]
+        else:
+            continue
+        if not any(isinstance(t, ast.Name) and t.id == "__all__"
+                   for t in targets):
+            continue
+
+        names = _string_list(node.value)
+        if names is None:
+            log.debug("  __all__ is not a literal, ignoring ...")
+            return None
+        if isinstance(node, ast.AugAssign):
+            if exports is None:
+                return None
+            exports = exports + names
+        else:
+            exports = names
+    if exports is None:
+        return None
+    return sorted(set(exports), key=exports.index)
+
+
+# Parser shared by every Node that is not given its own parser
+default_parser = SourceParser()
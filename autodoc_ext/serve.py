@@ -0,0 +1,227 @@
+import os
+import sys
+import tempfile
+import threading
+import mimetypes
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, unquote
+from logging import getLogger
+from os.path import abspath, dirname, exists, isfile, join, normpath
+from .tree import generate_tree, package_names, external_imports
+from .templates import generate_sphinx, generate_rst, generate_modules_rst
+from .sinks import FileSystemSink
+
+
+log = getLogger()
+
+# Same routing page that `templates.generate_docs_dir` creates
+REDIRECT_PAGE = b"<meta http-equiv=\"refresh\" content=\"0; url=./html/index.html\" />"
+
+
+class PreviewSite:
+    """Documentation site that is generated on demand. The tree of the
+    project is walked up front, every page is generated (and built with
+    sphinx) the first time it is requested. Built pages are kept in
+    memory until one of the files of the package changes.
+    """
+
+    def __init__(self, source, workdir=None, exclusions=[], **options):
+        """Initialize the instance of a PreviewSite
+
+        :param source: Directory where the project files reside.
+        :param workdir: Directory for the generated sources and the build.
+        Defaults to a new temporary directory.
+        :param exclusions: Exclude files/directories matching these names
+        :param options: See `args.check_args` for the accepted options. When
+        `MOCK_IMPORTS` is not provided (or None), the third party imports of
+        the project are mocked.
+        """
+        self.source = source
+        self.exclusions = exclusions
+        self.workdir = workdir or tempfile.mkdtemp(prefix="docu-serve-")
+        self.srcdir = join(self.workdir, "src")
+        self.outdir = join(self.workdir, "html")
+        self._lock = threading.RLock()
+        self._pages = {}
+
+        self.refresh()
+        if options.get("MOCK_IMPORTS") is None:
+            options["MOCK_IMPORTS"] = external_imports(self.tree)
+            log.info("Mocking imports: {}".format(options["MOCK_IMPORTS"]))
+        options.update({"SOURCE_DIR": self.srcdir, "BUILD_DIR": self.outdir})
+        generate_sphinx(sink=FileSystemSink(), **options)
+        generate_modules_rst(
+            self.tree.name, join(self.srcdir, "rst_docs"), sink=self._sink())
+
+        # autodoc imports the project from the directory above the source
+        self.project_path = dirname(abspath(self.tree.path))
+
+    def _sink(self):
+        """Sink for the generated sources."""
+        sink = FileSystemSink()
+        sink.makedirs(join(self.srcdir, "rst_docs"))
+        return sink
+
+    def refresh(self):
+        """Walk the project again and forget every built page."""
+        with self._lock:
+            log.info("Indexing {}".format(self.source))
+            self.tree = generate_tree(
+                directory=self.source, exclusions=self.exclusions)
+            self.index = dict(package_names(self.tree))
+            self._directories = {
+                name: os.stat(node.path).st_mtime_ns
+                for name, node in self.index.items()
+            }
+            self._pages.clear()
+
+    def _signature(self, package):
+        """State of the files of a package. The package is built again when
+        the signature changes. A changed directory (files added or removed)
+        refreshes the index.
+
+        :param package: Package name.
+        :return: Tuple of file states.
+        """
+        node = self.index[package]
+        if os.stat(node.path).st_mtime_ns != self._directories[package]:
+            self.refresh()
+            node = self.index[package]
+        signature = []
+        for filename in node.all_filenames:
+            stat = os.stat(filename)
+            signature.append((filename, stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+
+    def get(self, path):
+        """Respond to the request of a path.
+
+        :param path: Path of the request.
+        :return: Tuple of status code, content type and body.
+        """
+        path = unquote(urlparse(path).path)
+        if path in ("/", "/index.html"):
+            return 200, "text/html", REDIRECT_PAGE
+        if not path.startswith("/html/"):
+            return 404, "text/plain", b"Not found"
+
+        relative = path[len("/html/"):] or "index.html"
+        if relative.endswith(".html"):
+            docname = relative[:-len(".html")]
+            if docname in ("index", "rst_docs/modules"):
+                return self._page(docname, None)
+            if docname.startswith("rst_docs/"):
+                package = docname[len("rst_docs/"):]
+                if package in self.index:
+                    return self._page(docname, package)
+        return self._static(relative)
+
+    def _page(self, docname, package):
+        """Respond with a page, built when it is not cached.
+
+        :param docname: Sphinx document name of the page.
+        :param package: Package name of the page (None for index pages).
+        :return: Tuple of status code, content type and body.
+        """
+        with self._lock:
+            signature = self._signature(package) if package else ()
+            cached = self._pages.get(docname)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+            if package:
+                generate_rst(
+                    self.tree, join(self.srcdir, "rst_docs"),
+                    sink=self._sink(), packages={package})
+            response = self._build(docname)
+            self._pages[docname] = (signature, response)
+            return response
+
+    def _build(self, docname):
+        """Build a single page with sphinx. When sphinx is not available
+        the generated rst is returned.
+
+        :param docname: Sphinx document name of the page.
+        :return: Tuple of status code, content type and body.
+        """
+        rst_filename = join(self.srcdir, docname + ".rst")
+        try:
+            from sphinx.cmd.build import build_main
+        except ImportError:
+            log.warning("Sphinx is not installed, serving {}".format(
+                rst_filename))
+            with open(rst_filename, "rb") as rst_file:
+                return 200, "text/plain; charset=utf-8", rst_file.read()
+
+        log.info("Building {}".format(docname))
+        added = self.project_path not in sys.path
+        if added:
+            sys.path.insert(0, self.project_path)
+        try:
+            status = build_main(
+                ["-b", "html", "-q", self.srcdir, self.outdir, rst_filename])
+        finally:
+            if added and self.project_path in sys.path:
+                sys.path.remove(self.project_path)
+        html_filename = join(self.outdir, docname + ".html")
+        if status or not exists(html_filename):
+            log.error("Failed to build {}".format(docname))
+            return 500, "text/plain", "Failed to build {}".format(
+                docname).encode("utf-8")
+        with open(html_filename, "rb") as html_file:
+            return 200, "text/html", html_file.read()
+
+    def _static(self, relative):
+        """Respond with a file of the build (stylesheets, scripts, ...).
+
+        :param relative: Path relative to the build directory.
+        :return: Tuple of status code, content type and body.
+        """
+        filename = normpath(join(self.outdir, relative))
+        if not filename.startswith(normpath(self.outdir) + os.sep) or \
+                not isfile(filename):
+            return 404, "text/plain", b"Not found"
+        content_type = mimetypes.guess_type(filename)[0] or \
+            "application/octet-stream"
+        with open(filename, "rb") as static_file:
+            return 200, content_type, static_file.read()
+
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    """HTTP server handling every request in its own thread."""
+    daemon_threads = True
+
+
+class _PreviewHandler(BaseHTTPRequestHandler):
+    """Request handler delegating every GET request to the site."""
+    site = None
+
+    def do_GET(self):
+        status, content_type, body = self.site.get(self.path)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+
+def run_server(site, host="127.0.0.1", port=8000):
+    """Serve the site until interrupted.
+
+    :param site: PreviewSite that is served.
+    :param host: Address the server listens on.
+    :param port: Port the server listens on.
+    """
+    handler = type("PreviewHandler", (_PreviewHandler,), {"site": site})
+    server = _ThreadingServer((host, port), handler)
+    log.warning("Serving {} on http://{}:{}/".format(site.source, host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,225 @@
+import re
+from logging import getLogger
+from os.path import commonpath, dirname, exists, isdir, join
+from os.path import normpath, relpath
+from os import walk
+from yaml import safe_load
+from .artifacts import artifacts_filename, log_artifacts
+from .sinks import FileSystemSink
+from .symbols import SymbolIndex, load_symbol_index
+from .symbols import SYMBOL_INDEX_DIR, SYMBOL_OUTPUT_DIR
+from .templates import generate_sphinx
+from .tree import package_names
+
+
+log = getLogger()
+
+# Files of the shards that point to the source directory of the shard,
+# they are generated again for the merged tree
+BUILD_FILES = ("Makefile", "make.bat")
+
+# Build directory in the Makefile of a shard
+BUILD_DIR_PATTERN = re.compile(r"^BUILDDIR\s*=\s*(.*?)\s*$", re.MULTILINE)
+
+
+def parse_shard(value):
+    """Parse a shard specification in the form `I/N` where `I` is the
+    (1-based) index of the shard and `N` is the number of shards.
+
+    :param value: Shard specification string.
+    :return: Tuple of index and count.
+    """
+    try:
+        index, count = [int(x) for x in value.split("/")]
+    except ValueError:
+        raise ValueError("Shard must be formatted as I/N: {}".format(value))
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError("Shard index must be within 1 and N: {}".format(
+            value))
+    return index, count
+
+
+def node_cost(node):
+    """Estimated cost of generating the page for a node. Every file
+    results in an automodule directive and every class is documented.
+
+    :param node: Node of the project.
+    :return: Number of files plus the number of classes.
+    """
+    return len(node.files) + len(node.classes)
+
+
+def assign_shards(tree, count):
+    """Split the packages of the tree across the shards so that the cost
+    of every shard is balanced. The packages are placed, most expensive
+    first, on the shard with the lowest total cost. The assignment is
+    deterministic so every shard computes the same split.
+
+    :param tree: Node of the project.
+    :param count: Number of shards.
+    :return: Dictionary of package name to (1-based) shard index.
+    """
+    costs = sorted(
+        ((node_cost(node), name) for name, node in package_names(tree)),
+        key=lambda x: (-x[0], x[1])
+    )
+    totals = [0] * count
+    assignment = {}
+    for cost, name in costs:
+        shard = min(range(count), key=lambda i: (totals[i], i))
+        totals[shard] += cost
+        assignment[name] = shard + 1
+
+    log.debug("Shard costs: {}".format(totals))
+    return assignment
+
+
+def shard_packages(tree, index, count):
+    """Get the packages that the shard is responsible for.
+
+    :param tree: Node of the project.
+    :param index: (1-based) index of the shard.
+    :param count: Number of shards.
+    :return: Set of package names.
+    """
+    return {
+        name for name, shard in assign_shards(tree, count).items()
+        if shard == index
+    }
+
+
+def _read_manifest(shard_dir):
+    """Read the artifacts file (hidden or not) of a shard.
+
+    :param shard_dir: Source directory of the shard.
+    :return: Dictionary of artifacts.
+    """
+    filename = artifacts_filename(shard_dir)
+    if filename is None:
+        raise ValueError(
+            "Failed to find artifacts file in {}".format(shard_dir))
+    with open(filename, "r") as yaml_file:
+        return safe_load(yaml_file) or {}
+
+
+def _manifest_root(artifacts):
+    """Source directory of a shard as recorded in its artifacts, the
+    directory that contains every artifact. The shard may have been moved
+    (e.g. downloaded on another machine) since.
+
+    :param artifacts: Dictionary of artifacts of the shard.
+    :return: Directory of the artifacts when the shard was created.
+    """
+    paths = [normpath(artifact) for artifact in artifacts]
+    if len(paths) == 1:
+        return dirname(paths[0])
+    return commonpath(paths)
+
+
+def _build_dir(shard_dir):
+    """Build directory of a shard, read from its Makefile.
+
+    :param shard_dir: Source directory of the shard.
+    :return: Build directory, `docs` when it can not be read.
+    """
+    try:
+        with open(join(shard_dir, "Makefile"), "r") as makefile:
+            found = BUILD_DIR_PATTERN.search(makefile.read())
+    except (IOError, OSError):
+        found = None
+    return found.group(1) if found else "docs"
+
+
+def merge_shards(shard_dirs, output_dir, hide_file=False, sink=None):
+    """Combine the outputs of shards into a single tree ready to build. The
+    files shared by all shards (sphinx configuration, `modules.rst`) are
+    written once, the rst pages of every shard are collected and the
+    artifacts of the shards are merged into one artifacts file. The
+    artifacts are found relative to the shard directories, so the shards
+    may be merged from any location. The Makefile and make.bat are
+    generated again for `output_dir` and the symbol indexes of the shards
+    (see `symbols`) are combined into one index.
+
+    :param shard_dirs: Source directories of the shards.
+    :param output_dir: Source directory of the merged tree.
+    :param hide_file: When true, hide the merged artifacts file.
+    :param sink: OutputSink receiving the files. Defaults to the filesystem.
+    :return: Dictionary of merged artifacts.
+    """
+    sink = sink or FileSystemSink()
+    sink.makedirs(output_dir)
+
+    merged = {}
+    written = {}
+    build_files = [join(output_dir, name) for name in BUILD_FILES]
+    index_dir = join(output_dir, SYMBOL_INDEX_DIR, SYMBOL_OUTPUT_DIR)
+    symbols = None
+    for shard_dir in sorted(shard_dirs):
+        log.info("Merging shard {}".format(shard_dir))
+        manifest = _read_manifest(shard_dir)
+        root = _manifest_root(manifest) if manifest else shard_dir
+        _, shard_symbols = load_symbol_index(
+            join(shard_dir, SYMBOL_INDEX_DIR, SYMBOL_OUTPUT_DIR))
+        if shard_symbols:
+            symbols = symbols or SymbolIndex()
+            symbols.merge(shard_symbols)
+
+        for recorded, keep in sorted(manifest.items()):
+            relative = relpath(normpath(recorded), root)
+            if relative.startswith(".."):
+                log.warning("Artifact {} is outside of {}, skipping ...".format(
+                    recorded, root))
+                continue
+            artifact = join(shard_dir, relative)
+            target = join(output_dir, relative)
+            merged[target] = keep or merged.get(target, False)
+
+            if target in build_files:
+                continue
+            elif not exists(artifact):
+                log.warning("Could not find: {}, skipping ...".format(artifact))
+            elif isdir(artifact):
+                sink.makedirs(target)
+                for root, dirs, files in walk(artifact):
+                    dirs.sort()
+                    for filename in sorted(files):
+                        file_target = join(target, relpath(
+                            join(root, filename), artifact))
+                        if dirname(file_target) == index_dir:
+                            # the symbol indexes are combined below
+                            continue
+                        _merge_file(sink, written, join(root, filename),
+                                    file_target)
+            else:
+                _merge_file(sink, written, artifact, target)
+
+    if symbols is not None:
+        symbols.write(index_dir, sink=sink)
+    generate_sphinx(
+        sink=sink, names=BUILD_FILES, SOURCE_DIR=output_dir,
+        BUILD_DIR=_build_dir(sorted(shard_dirs)[0]))
+    log_artifacts(output_dir, merged, hide_file=hide_file, sink=sink)
+    return merged
+
+
+def _merge_file(sink, written, source, target):
+    """Write a file of a shard into the merged tree once. Files that were
+    already written by another shard must be identical.
+
+    :param sink: OutputSink receiving the files.
+    :param written: Dictionary of target filename to written contents.
+    :param source: File of the shard.
+    :param target: File in the merged tree.
+    """
+    with open(source, "rb") as source_file:
+        contents = source_file.read()
+
+    if target in written:
+        if written[target] != contents:
+            log.warning("{} differs between shards, keeping the first".format(
+                target))
+        return
+
+    written[target] = contents
+    sink.makedirs(dirname(target))
+    sink.write(target, contents)
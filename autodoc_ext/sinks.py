@@ -0,0 +1,269 @@
+from logging import getLogger
+from os import environ, makedirs, link
+from os.path import exists, normpath, relpath
+from shutil import rmtree, copyfile
+from io import BytesIO
+import gzip
+import tarfile
+import time
+import zipfile
+
+
+log = getLogger()
+
+
+class OutputSink:
+    """Destination for every file generated by the application. The
+    generators (`generate_sphinx`, `generate_rst`, ...) never open files
+    themselves, they hand the contents to a sink.
+    """
+
+    def makedirs(self, directory):
+        """Ensure that a directory exists in the sink.
+
+        :param directory: Directory that should exist.
+        """
+
+    def reset_directory(self, directory):
+        """Remove everything in the directory and recreate it empty.
+
+        :param directory: Directory that should be emptied.
+        """
+        self.makedirs(directory)
+
+    def write(self, filename, contents):
+        """Write the contents to the filename in the sink.
+
+        :param filename: Name/path of the file.
+        :param contents: String (or bytes) contents of the file.
+        """
+        raise NotImplementedError
+
+    def copy(self, source, filename):
+        """Write the contents of a file that was written to the sink
+        before to another filename.
+
+        :param source: Name/path of the file written before.
+        :param filename: Name/path of the copy.
+        """
+        raise NotImplementedError
+
+    def touch(self, filename):
+        """Create an empty file.
+
+        :param filename: Name/path of the file.
+        """
+        self.write(filename, "")
+
+    def close(self):
+        """Finish all writes to the sink."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FileSystemSink(OutputSink):
+    """Sink that writes files to disk (default behavior)."""
+
+    def makedirs(self, directory):
+        if not exists(directory):
+            log.info("Creating directory {}".format(directory))
+            makedirs(directory)
+
+    def reset_directory(self, directory):
+        if exists(directory):
+            rmtree(directory)
+        makedirs(directory)
+
+    def write(self, filename, contents):
+        log.info("Writing data to {}".format(filename))
+        mode = "wb+" if isinstance(contents, bytes) else "w+"
+        with open(filename, mode) as output:
+            output.write(contents)
+
+    def copy(self, source, filename):
+        log.info("Linking {} to {}".format(filename, source))
+        try:
+            link(source, filename)
+        except OSError:
+            copyfile(source, filename)
+
+
+class MemorySink(OutputSink):
+    """Sink that keeps all files in memory. The `files` dictionary maps
+    the normalized filename to the contents of the file.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.directories = set()
+
+    def makedirs(self, directory):
+        self.directories.add(normpath(directory))
+
+    def reset_directory(self, directory):
+        directory = normpath(directory)
+        prefix = directory + "/"
+        self.files = {
+            k: v for k, v in self.files.items() if not k.startswith(prefix)
+        }
+        self.directories = {
+            d for d in self.directories if not d.startswith(prefix)
+        }
+        self.directories.add(directory)
+
+    def write(self, filename, contents):
+        log.debug("Storing {} in memory".format(filename))
+        self.files[normpath(filename)] = contents
+
+    def copy(self, source, filename):
+        self.write(filename, self.files[normpath(source)])
+
+
+def _archive_mtime():
+    """Timestamp of the archive members. `SOURCE_DATE_EPOCH` (see
+    https://reproducible-builds.org/specs/source-date-epoch/) makes the
+    archives reproducible, zip archives can not store times before 1980.
+
+    :return: Seconds since the epoch.
+    """
+    mtime = int(environ.get("SOURCE_DATE_EPOCH", time.time()))
+    return max(mtime, 315532800)
+
+
+class ArchiveSink(OutputSink):
+    """Sink that streams every file into a single zip or tar archive. The
+    format is determined by the extension of the archive name:
+    `.zip`, `.tar`, `.tar.gz`/`.tgz`, `.tar.bz2`, `.tar.xz` and
+    `.tar.zst` (requires the `zstandard` package). Every member receives
+    the same timestamp, see `_archive_mtime`.
+    """
+
+    TAR_MODES = {
+        ".tar": "w|",
+        ".tar.bz2": "w|bz2",
+        ".tar.xz": "w|xz",
+    }
+
+    def __init__(self, target, root="."):
+        """Initialize the archive sink.
+
+        :param target: Filename of the archive to create.
+        :param root: Directory that archive members are relative to.
+        """
+        self.target = target
+        self.root = root
+        self._stream = None
+        self._compressor = None
+        self._zip = None
+        self._tar = None
+        self._directories = set()
+        self._mtime = _archive_mtime()
+
+        lower = target.lower()
+        if lower.endswith(".zip"):
+            self._zip = zipfile.ZipFile(
+                target, "w", compression=zipfile.ZIP_DEFLATED)
+        elif lower.endswith((".tar.zst", ".tar.zstd")):
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError(
+                    "The zstandard package is required to write {}".format(
+                        target))
+            self._stream = open(target, "wb")
+            self._compressor = zstandard.ZstdCompressor().stream_writer(
+                self._stream)
+            self._tar = tarfile.open(fileobj=self._compressor, mode="w|")
+        elif lower.endswith((".tar.gz", ".tgz")):
+            # tarfile would write the current time to the gzip header
+            self._stream = open(target, "wb")
+            self._compressor = gzip.GzipFile(
+                filename="", fileobj=self._stream, mode="wb",
+                mtime=self._mtime)
+            self._tar = tarfile.open(fileobj=self._compressor, mode="w|")
+        else:
+            mode = None
+            for ext, tar_mode in self.TAR_MODES.items():
+                if lower.endswith(ext):
+                    mode = tar_mode
+            if mode is None:
+                raise ValueError(
+                    "Unsupported archive format: {}".format(target))
+            self._stream = open(target, "wb")
+            self._tar = tarfile.open(fileobj=self._stream, mode=mode)
+
+    def _arcname(self, filename):
+        """Name of the member in the archive."""
+        name = relpath(normpath(filename), normpath(self.root))
+        return name.replace("\\", "/")
+
+    def makedirs(self, directory):
+        name = self._arcname(directory)
+        if name in (".", "") or name in self._directories:
+            return
+        self._directories.add(name)
+        if self._tar is not None:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o755
+            info.mtime = self._mtime
+            self._tar.addfile(info)
+        else:
+            self._zip.writestr(self._zipinfo(name + "/", 0o40755), "")
+
+    def write(self, filename, contents):
+        name = self._arcname(filename)
+        log.info("Adding {} to {}".format(name, self.target))
+        data = contents if isinstance(contents, bytes) else \
+            contents.encode("utf-8")
+        if self._tar is not None:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = self._mtime
+            self._tar.addfile(info, BytesIO(data))
+        else:
+            self._zip.writestr(self._zipinfo(name, 0o644), data)
+
+    def copy(self, source, filename):
+        name = self._arcname(filename)
+        log.info("Adding {} to {}".format(name, self.target))
+        if self._tar is not None:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.LNKTYPE
+            info.linkname = self._arcname(source)
+            info.mode = 0o644
+            info.mtime = self._mtime
+            self._tar.addfile(info)
+        else:
+            # zip archives have no links, the member is read back
+            self._zip.writestr(
+                self._zipinfo(name, 0o644),
+                self._zip.read(self._arcname(source)))
+
+    def _zipinfo(self, name, mode):
+        """Member information of a zip archive member."""
+        info = zipfile.ZipInfo(name, time.gmtime(self._mtime)[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = mode << 16
+        if name.endswith("/"):
+            info.external_attr |= 0x10
+        return info
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+        if self._compressor is not None:
+            self._compressor.close()
+            self._compressor = None
+        if self._stream is not None and not self._stream.closed:
+            self._stream.close()
+        self._stream = None
@@ -0,0 +1,188 @@
+"""Compact symbol index of the generated documentation.
+
+The index maps the qualified name of every documented module, class and
+function to the page and anchor that document it, its kind and the first
+line of its docstring. It is built from the summaries while the rst pages
+are generated, so it is complete before sphinx runs. The index is split
+into one shard per top level package (the root package and each of its
+direct subpackages) so a frontend only loads the shard of the names it
+looks up:
+
+- `index.json`: the manifest, listing the file, hash and size of every
+  shard
+- `<shard>.json`: package name to a dictionary of qualified name to
+  `[page, anchor, kind, summary]`, where the page is the sphinx document
+  name (e.g. `rst_docs/pkg.sub`)
+
+Shards whose contents did not change are not written again.
+"""
+import os
+import re
+import hashlib
+from json import dumps, loads
+from logging import getLogger
+from .parse import public_names
+from .sinks import FileSystemSink
+
+
+log = getLogger()
+
+# Directory of the index in SOURCE_DIR, copied into the HTML output
+SYMBOL_INDEX_DIR = "_symbol_index"
+
+# Directory of the shards in the HTML output
+SYMBOL_OUTPUT_DIR = "symbols"
+
+# Name of the manifest of the shards
+MANIFEST_FILENAME = "index.json"
+
+SYMBOL_INDEX_FORMAT = "autodoc_ext-symbols"
+SYMBOL_INDEX_VERSION = 1
+
+# Modules documented on a rendered page
+MODULE_DIRECTIVE = re.compile(r"^\.\. automodule:: (\S+)$", re.MULTILINE)
+
+
+def shard_name(package):
+    """Name of the shard of a package: the root package, or the direct
+    subpackage of the root that contains the package.
+
+    :param package: Package (page) name.
+    :return: Shard name.
+    """
+    return ".".join(package.split(".")[:2])
+
+
+def _dumps(data):
+    """Serialize compactly and deterministically."""
+    return dumps(data, sort_keys=True, separators=(",", ":"))
+
+
+class SymbolIndex:
+    """Symbols of the documented packages, grouped by shard and package.
+    Packages are added as their pages are generated (see
+    `templates.generate_rst`).
+    """
+
+    def __init__(self, prefix="rst_docs"):
+        """Initialize the instance of a SymbolIndex
+
+        :param prefix: Directory of the rst pages relative to SOURCE_DIR.
+        """
+        self.prefix = prefix
+        self.shards = {}
+
+    def add_package(self, package, pages, summaries):
+        """Index the modules documented on the pages of a package, with
+        their exported classes and functions (see `parse.public_names`).
+        Names that are only re-exported are indexed where they are defined.
+
+        :param package: Package (page) name.
+        :param pages: List of page name and contents of the package.
+        :param summaries: Dictionary of module name to summary.
+        """
+        entries = {}
+        for page, output in pages:
+            docname = "{}/{}".format(self.prefix, page)
+            for module in MODULE_DIRECTIVE.findall(output):
+                summary = summaries.get(module)
+                if summary is None or module in entries:
+                    continue
+                entries[module] = [
+                    docname, "module-" + module, "module",
+                    summary.get("docstring", "")]
+                exported = set(public_names(summary))
+                docstrings = summary.get("docstrings", {})
+                for name, kind in summary.get("definitions", []):
+                    if name in exported:
+                        qualified = "{}.{}".format(module, name)
+                        entries[qualified] = [
+                            docname, qualified, kind,
+                            docstrings.get(name, "")]
+        self.shards.setdefault(shard_name(package), {})[package] = entries
+
+    def merge(self, previous):
+        """Keep the packages of a previous index that were not indexed
+        again (partial generations, e.g. shards or changed packages).
+
+        :param previous: Dictionary of shard to package to entries.
+        """
+        for shard, packages in previous.items():
+            current = self.shards.setdefault(shard, {})
+            for package, entries in packages.items():
+                current.setdefault(package, entries)
+
+    def write(self, directory, sink=None, manifest=None):
+        """Write the shards and the manifest. Shards with the same hash as
+        in the previous manifest are not written again.
+
+        :param directory: Directory of the index.
+        :param sink: OutputSink receiving the files. Defaults to the
+        filesystem.
+        :param manifest: Manifest of the index in `directory`, see
+        `load_symbol_index`.
+        :return: The new manifest.
+        """
+        sink = sink or FileSystemSink()
+        previous = (manifest or {}).get("shards", {})
+        sink.makedirs(directory)
+
+        shards = {}
+        written = 0
+        for shard in sorted(self.shards):
+            data = _dumps(self.shards[shard])
+            digest = hashlib.sha256(data.encode("utf-8")).hexdigest()
+            filename = shard + ".json"
+            shards[shard] = {
+                "file": filename,
+                "sha256": digest,
+                "symbols": sum(
+                    len(e) for e in self.shards[shard].values())
+            }
+            if previous.get(shard) == shards[shard]:
+                log.debug("Symbol shard {} is unchanged".format(shard))
+                continue
+            sink.write(os.path.join(directory, filename), data)
+            written += 1
+
+        new_manifest = {
+            "format": SYMBOL_INDEX_FORMAT,
+            "version": SYMBOL_INDEX_VERSION,
+            "shards": shards
+        }
+        if new_manifest != manifest:
+            sink.write(os.path.join(directory, MANIFEST_FILENAME),
+                       _dumps(new_manifest))
+        log.info("Symbol index: {} shards, {} written".format(
+            len(shards), written))
+        return new_manifest
+
+
+def load_symbol_index(directory):
+    """Read an index written by `SymbolIndex.write` from disk. A missing
+    or incompatible index results in an empty index.
+
+    :param directory: Directory of the index.
+    :return: Tuple of the manifest (None when there is no index) and the
+    dictionary of shard to package to entries.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_FILENAME), "r") as stream:
+            manifest = loads(stream.read())
+    except (IOError, OSError, ValueError):
+        return None, {}
+    if manifest.get("format") != SYMBOL_INDEX_FORMAT or \
+            manifest.get("version") != SYMBOL_INDEX_VERSION:
+        log.info("Symbol index {} is outdated, ignoring ...".format(
+            directory))
+        return None, {}
+
+    shards = {}
+    for shard, info in manifest["shards"].items():
+        try:
+            with open(os.path.join(directory, info["file"]), "r") as stream:
+                shards[shard] = loads(stream.read())
+        except (IOError, OSError, ValueError):
+            # the shard is written again
+            manifest["shards"][shard] = None
+    return manifest, shards
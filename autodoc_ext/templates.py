@@ -3,10 +3,11 @@ from os.path import abspath, dirname, isfile, join
 from os import listdir
 from logging import getLogger
 from .args import check_args
-from os.path import exists, join
-from os import makedirs
-from shutil import rmtree
-from pathlib import Path
+from .sinks import FileSystemSink
+from .cache import content_key
+from .events import emit, timed
+from json import dumps
+from collections import OrderedDict
 
 
 log = getLogger()
@@ -23,6 +24,36 @@ subPackageTemplate = \
 
 '''
 
+subModuleTemplate = \
+'''
+Submodules
+----------
+
+.. toctree::
+   :maxdepth: 4
+
+   {{ SUBMODULES }}
+
+'''
+
+continuedTemplate = \
+'''
+
+Continued
+---------
+
+.. toctree::
+   :maxdepth: 1
+
+   {{ PARTS }}
+'''
+
+pageTemplate = \
+'''{{ TITLE }}
+{{ "=" * (TITLE|length) }}
+
+{{ CONTENTS }}'''
+
 autoBaseModuleTemplate = \
 '''.. automodule:: {{ PACKAGE }}
 
@@ -35,6 +66,13 @@ autoModuleTemplate = \
 
 '''
 
+autoMembersTemplate = \
+'''.. automodule:: {{ PACKAGE }}
+   :members: {{ MEMBERS }}
+   :undoc-members:
+
+'''
+
 autoClassTemplate = \
 '''.. {{ AUTOTYPE }}:: {{ CLASSNAME }}
    :members:
@@ -43,8 +81,88 @@ autoClassTemplate = \
 
 '''
 
+# Layouts for the generated rst pages. `package` places every directive
+# for a package on the package page, `module` creates one page per module.
+PAGE_LAYOUTS = ("package", "module")
+
+# Templates of whole pages, their outputs are not memoized
+PAGE_TEMPLATES = ("rst", "page")
+
 
-def generate_sphinx(*args, **kwargs):
+class FragmentRenderer:
+    """Render the directive fragments and pages of the rst documents.
+    The small directive fragments are memoized by template and input, and
+    the pages of a package are only rendered again when the inputs of the
+    package have changed since the last render. A renderer is shared by
+    repeated generations of a mostly unchanged tree (e.g. the versions of
+    `api.build_versions`) so they are (almost) free; it holds the pages of
+    every package for its lifetime.
+    """
+
+    def __init__(self, max_fragments=100000):
+        """Initialize the instance of a FragmentRenderer
+
+        :param max_fragments: Maximum number of memoized fragments, the
+        least recently used fragments are dropped first.
+        """
+        self.max_fragments = max_fragments
+        self._templates = {}
+        self._fragments = OrderedDict()
+        self._pages = {}
+
+    def render(self, source, data, memoize=True):
+        """Render a template, reusing the output of a previous render with
+        the same template and data.
+
+        :param source: Source of the Jinja template.
+        :param data: dict of template data (values must be hashable).
+        :param memoize: When false, the output is neither looked up nor
+        stored. Used for whole pages, their data contains the contents of
+        the page.
+        :return: Rendered template.
+        """
+        if source not in self._templates:
+            self._templates[source] = Template(source)
+        if not memoize:
+            return self._templates[source].render(data)
+
+        key = (source, tuple(sorted(data.items())))
+        if key in self._fragments:
+            self._fragments.move_to_end(key)
+            return self._fragments[key]
+
+        output = self._templates[source].render(data)
+        self._fragments[key] = output
+        while len(self._fragments) > self.max_fragments:
+            self._fragments.popitem(last=False)
+        return output
+
+    def pages(self, package, key, build):
+        """Get the pages of a package. The pages are only built when the
+        key (the inputs of the package) changed since the last call.
+
+        :param package: Package name.
+        :param key: String identifying all inputs of the pages.
+        :param build: Function without parameters that builds the pages.
+        :return: List of page name and page contents.
+        """
+        cached = self._pages.get(package)
+        if cached is not None and cached[0] == key:
+            log.debug("  Pages for {} are unchanged".format(package))
+            emit("cache.hit", namespace="renderer")
+            return cached[1]
+        emit("cache.miss", namespace="renderer")
+        pages = build()
+        self._pages[package] = (key, pages)
+        return pages
+
+    def clear(self):
+        """Forget all memoized fragments and pages."""
+        self._fragments.clear()
+        self._pages.clear()
+
+
+def generate_sphinx(*args, sink=None, names=None, **kwargs):
     """
     Find all .j2 extension files in this directory. Fill the template files
     with the parameters that were passed in to this function. See
@@ -64,19 +182,29 @@ def generate_sphinx(*args, **kwargs):
     :param EXCLUSIONS: Path(s) and patterns of files to exclude from docs.
     :param THEME: The theme to use for HTML and HTML Help pages.
     :param STATIC_PATHS: Path(s) that contain custom static files.
+    :param EXTRA_PATHS: Path(s) copied to the root of the HTML output.
     :param SOURCE_DIR: Directory for the source of the software package.
     :param BUILD_DIR: Directory where the sphinx build will occur.
+    :param MOCK_IMPORTS: Modules that autodoc mocks instead of importing.
+    :param INTERSPHINX_MAPPING: Dictionary of project name to URL and
+    local inventory.
+    :param sink: OutputSink receiving the files. Defaults to the filesystem.
+    :param names: Only generate these files (e.g. `["Makefile"]`). Defaults
+    to None (all files).
     :return: List of files that were generated
     """
+    sink = sink or FileSystemSink()
     fargs = check_args(**kwargs)
-    print(fargs)
+    log.debug("Sphinx template arguments: {}".format(fargs))
     templates_path = join(dirname(abspath(__file__)), "templates/sphinx")
     j2files = {
       join(templates_path, f): f
-      for f in listdir(templates_path)
-      if isfile(join(templates_path, f)) and f.endswith(".j2")
+      for f in sorted(listdir(templates_path))
+      if isfile(join(templates_path, f)) and f.endswith(".j2") and
+      (names is None or f[:-len(".j2")] in names)
     }
     source = fargs["SOURCE_DIR"]
+    sink.makedirs(source)
 
     generated_files = []
     for full_file, j2file in j2files.items():
@@ -90,21 +218,21 @@ def generate_sphinx(*args, **kwargs):
         # write the files to the source directory where project
         # code should reside
         gen_file_name = join(source, j2file.replace(".j2", ""))
-        log.info("Writing data to {}".format(gen_file_name))
-        with open(gen_file_name, "w+") as ic:
-            ic.write(output)
+        sink.write(gen_file_name, output)
         generated_files.append(gen_file_name)
 
     return generated_files
 
 
-def generate_modules_rst(package, directory):
+def generate_modules_rst(package, directory, sink=None):
   """Generate the base modules.rst file
 
   :param package: name of th software package
   :param directory: location where the artifacts will be placed.
+  :param sink: OutputSink receiving the file. Defaults to the filesystem.
   :return: name/path of the generated file
   """
+  sink = sink or FileSystemSink()
   log.debug("Generating modules.rst")
   template_file = join(dirname(abspath(__file__)), 
                        "templates/rst/modules.rst.j2")
@@ -116,60 +244,153 @@ def generate_modules_rst(package, directory):
     output = template.render({"PACKAGE": package})
   
   generated_file = join(directory, "modules.rst")
-  log.info("Writing data to {}".format(generated_file))
-  with open(generated_file, "w+") as gen_file:
-    gen_file.write(output)
+  sink.write(generated_file, output)
   
   return generated_file
 
 
-def generate_rst(tree, directory="."):
+def _split_contents(contents, max_directives=None, max_bytes=None):
+    """Split the directives of a page into chunks that stay within the
+    budgets. A single directive larger than `max_bytes` gets its own chunk.
+
+    :param contents: List of rendered directives.
+    :param max_directives: Maximum number of directives per chunk.
+    :param max_bytes: Maximum number of bytes per chunk.
+    :return: List of chunks (lists of directives), at least one.
+    """
+    chunks = [[]]
+    size = 0
+    for fragment in contents:
+        fragment_size = len(fragment.encode("utf-8"))
+        chunk = chunks[-1]
+        if chunk and (
+            (max_directives and len(chunk) >= max_directives) or
+            (max_bytes and size + fragment_size > max_bytes)
+        ):
+            chunk = []
+            chunks.append(chunk)
+            size = 0
+        chunk.append(fragment)
+        size += fragment_size
+    return chunks
+
+
+def generate_rst(tree, directory=".", sink=None, layout="package",
+                 max_directives=None, max_bytes=None, packages=None,
+                 cache=None, renderer=None, public_api=False, symbols=None):
     """Generate the rst files for the tree
 
     :param tree: Node class that is used to generate rst documents.
     :param directory: Output directory for all rst documents.
+    :param sink: OutputSink receiving the files. Defaults to the filesystem.
+    :param layout: Page layout, see `PAGE_LAYOUTS`. Defaults to `package`.
+    :param max_directives: Split package pages after this many directives.
+    :param max_bytes: Split package pages after this many bytes.
+    :param packages: Only generate the pages of these packages. Defaults
+    to None (all packages).
+    :param cache: ContentCache for the rendered pages. Defaults to None.
+    :param renderer: FragmentRenderer memoizing the rendered fragments and
+    pages across generations. Defaults to None: the fragments are memoized
+    for this generation only and the pages are not kept.
+    :param public_api: When true, only the names exported by the modules
+    are documented, see `Node.public_templates`.
+    :param symbols: SymbolIndex receiving the symbols of the generated
+    pages. Defaults to None.
     :return: Dictionary of artifacts that were created
     """
-    def _generate_rst(artifact_dict, t, d, templates, p=None):
-        """Generate the rst files for the tree [inner function]
+    if layout not in PAGE_LAYOUTS:
+        raise ValueError("Unknown page layout: {}".format(layout))
 
-        :param: artifact_dict: Dictionary of artifacts
-        :param t: Node class that is used to generate rst documents.
-        :param d: Output directory for all rst documents.
-        :param templates: dict of Jinja Templates
-        :param p: Parent string for the current node. Defaults to None.
+    def _write_page(artifact_dict, name, output):
+        """Write a single rst page and record it as an artifact [inner
+        function]
+
+        :param artifact_dict: Dictionary of artifacts
+        :param name: Name of the page (without extension).
+        :param output: Contents of the page.
+        """
+        rst_filename = join(directory, "{}.rst".format(name))
+        log.info("Generating {}".format(rst_filename))
+        sink.write(rst_filename, output)
+        emit("rst.write", filename=rst_filename,
+             bytes=len(output.encode("utf-8")))
+        log.debug("Saving artifact: {}".format(rst_filename))
+        artifact_dict[str(rst_filename)] = False
+
+    def _render(name, data):
+        """Render a template through the renderer [inner function]
+
+        :param name: Name of the template in `sources`.
+        :param data: dict of template data.
+        :return: Rendered template.
+        """
+        return fragments.render(
+            sources[name], data, memoize=name not in PAGE_TEMPLATES)
+
+    def _module_directive(node_templates, module):
+        """Render the directive of a module, limited to the exported
+        members in the public API templates [inner function]
+
+        :param node_templates: Templates of the node.
+        :param module: Module name.
+        :return: Rendered directive.
         """
-        template_data = {"PACKAGE": p+"."+t.name if p is not None else t.name}
-        subpackages = ["{}.{}".format(
-          template_data["PACKAGE"], child.name) for child in t.children]
+        if "members" in node_templates:
+            return _render("members", {
+                "PACKAGE": module,
+                "MEMBERS": ", ".join(node_templates["members"][module])
+            })
+        return _render("module", {"PACKAGE": module})
+
+    def _render_pages(node_templates, package, subpackages):
+        """Render the rst pages of a single node [inner function]
+
+        :param node_templates: Templates of the node, see `Node.templates`.
+        :param package: Package (page) name of the node.
+        :param subpackages: Package names of the children of the node.
+        :return: List of page name and page contents, in write order.
+        """
+        pages = []
+        template_data = {"PACKAGE": package}
         if subpackages:
-            template_data["SUBPACKAGE_DATA"] = templates["subs"].render(
+            template_data["SUBPACKAGE_DATA"] = _render("subs",
               {"SUBPACKAGES": "\n   ".join(subpackages)}
             )
 
         contents = []
-        node_templates = t.templates
-        if "base" in node_templates:
-            contents.append(templates["base"].render({"PACKAGE": node_templates["base"]}))
+        submodules = []
+        if node_templates.get("base_members"):
+            contents.append(_render("members", {
+                "PACKAGE": node_templates["base"],
+                "MEMBERS": ", ".join(node_templates["base_members"])
+            }))
+        elif "base" in node_templates:
+            contents.append(_render("base", {"PACKAGE": node_templates["base"]}))
         
         for mod in node_templates["modules"]:
-            contents.append(
-                 templates["module"].render({"PACKAGE": mod}))
-
+            module_directive = _module_directive(node_templates, mod)
+            if layout == "module":
+                # each module receives its own page, the name can not be
+                # shared with the page of a subpackage
+                page = mod if mod not in subpackages else mod + ".module"
+                submodules.append(page)
+                pages.append((page, _render("page", {
+                    "TITLE": "{} module".format(mod),
+                    "CONTENTS": module_directive
+                })))
+            else:
+                contents.append(module_directive)
+
+        if submodules:
+            template_data["SUBMODULE_DATA"] = _render("submodules",
+              {"SUBMODULES": "\n   ".join(submodules)}
+            )
 
-        #
-        #contents.append(templates["module"].render(template_data))
-        #for _, shortfile in t.project_files(t.public_filenames).items():
-        #       contents.append(
-        #         templates["module"].render({"PACKAGE": shortfile}))
-       
-        
-        #classes = t.classes
         classes = node_templates["classes"]
         if classes:
             for c in classes:
                 auto_class_filler = {
-                  "PACKAGE": template_data["PACKAGE"], 
+                  "PACKAGE": package, 
                   "CLASSNAME": c,
                   "AUTOTYPE": "autoclass"
                 }
@@ -179,70 +400,131 @@ def generate_rst(tree, directory="."):
                     auto_class_filler["AUTOTYPE"] = "autoexception"
                     log.debug("{} is an exception".format(c))
 
-                contents.append(templates["class"].render(auto_class_filler))
+                contents.append(_render("class", auto_class_filler))
+
+        # pages that are over budget continue on additional part pages
+        chunks = _split_contents(contents, max_directives, max_bytes)
+        parts = []
+        for index, chunk in enumerate(chunks[1:], start=2):
+            part = "{}.part{}".format(package, index)
+            parts.append(part)
+            pages.append((part, _render("page", {
+                "TITLE": "{} package (part {})".format(package, index),
+                "CONTENTS": "\n\n".join(chunk)
+            })))
+        if parts:
+            template_data["CONTINUED_DATA"] = _render("continued",
+              {"PARTS": "\n   ".join(parts)}
+            )
 
         # fill the contents section with the templates created
-        template_data["CONTENTS"] = "\n\n".join(contents)
+        template_data["CONTENTS"] = "\n\n".join(chunks[0])
         
-        output = templates["rst"].render(template_data)
-        rst_filename = join(directory, "{}.rst".format(
-          template_data["PACKAGE"]))
-        log.info("Generating {}".format(rst_filename))
-        with open(rst_filename, "w+") as rst_file:
-            rst_file.write(output)
-        log.debug("Saving artifact: {}".format(rst_file))
-        artifact_dict[str(rst_filename)] = False
+        pages.append((package, _render("rst", template_data)))
+        return pages
+
+    def _generate_rst(artifact_dict, t, d, p=None):
+        """Generate the rst files for the tree [inner function]
+
+        :param: artifact_dict: Dictionary of artifacts
+        :param t: Node class that is used to generate rst documents.
+        :param d: Output directory for all rst documents.
+        :param p: Parent string for the current node. Defaults to None.
+        """
+        package = p+"."+t.name if p is not None else t.name
+        if packages is None or package in packages:
+            subpackages = ["{}.{}".format(
+              package, child.name) for child in t.children]
+
+            node_templates = t.public_templates if public_api else \
+                t.templates
+            inputs = template_key + dumps({
+                "package": package,
+                "subpackages": subpackages,
+                "templates": node_templates,
+                "layout": layout,
+                "max_directives": max_directives,
+                "max_bytes": max_bytes
+            }, sort_keys=True)
+
+            def _build():
+                key = content_key("pages", inputs)
+                pages = cache.get_json("pages", key) if cache else None
+                if pages is None:
+                    with timed("page.render", package=package) as render:
+                        pages = _render_pages(
+                            node_templates, package, subpackages)
+                        render["pages"] = len(pages)
+                    if cache is not None:
+                        cache.put_json("pages", key, pages)
+                return pages
+
+            if renderer is not None:
+                pages = renderer.pages(package, inputs, _build)
+            else:
+                pages = _build()
+            for name, output in pages:
+                _write_page(artifact_dict, name, output)
+            if symbols is not None:
+                symbols.add_package(package, pages, t.module_summaries)
+        else:
+            log.debug("Skipping {}".format(package))
         
         for child in t.children:
-            _generate_rst(
-              artifact_dict,child, d, templates, p=template_data["PACKAGE"])
-
-    # Dictionary that will contain all Templates so they do not need to be 
-    # generated each time the inner function is called
-    templates = {
-      "base": Template(autoBaseModuleTemplate),
-      "module": Template(autoModuleTemplate),
-      "class": Template(autoClassTemplate),
-      "subs": Template(subPackageTemplate)
+            _generate_rst(artifact_dict, child, d, p=package)
+
+    # Dictionary that will contain all Templates, the renderer compiles
+    # each of them once
+    fragments = renderer or FragmentRenderer()
+    sources = {
+      "base": autoBaseModuleTemplate,
+      "module": autoModuleTemplate,
+      "members": autoMembersTemplate,
+      "class": autoClassTemplate,
+      "subs": subPackageTemplate,
+      "submodules": subModuleTemplate,
+      "continued": continuedTemplate,
+      "page": pageTemplate
     }
     template_file = join(dirname(abspath(__file__)), "templates/rst/rst.j2")
     log.info("Reading template {}".format(template_file))
     with open(template_file, "r") as j2file:
-      templates["rst"] = Template(j2file.read())
+      sources["rst"] = j2file.read()
+    template_key = content_key(*[
+      name + "\0" + source for name, source in sorted(sources.items())])
       
+    sink = sink or FileSystemSink()
     log.info("Generating rst files in {}".format(directory))
-    if not exists(directory):
-        log.info("Creating directory {}".format(directory))
-        makedirs(directory)
+    sink.makedirs(directory)
 
     artifacts = {
       directory: False,
-      generate_modules_rst(tree.name, directory=directory): False
+      generate_modules_rst(tree.name, directory=directory, sink=sink): False
     }
-    _generate_rst(artifacts, tree, directory, templates)
+    _generate_rst(artifacts, tree, directory)
     return artifacts
 
 
-def generate_docs_dir(source_dir, build_dir):
+def generate_docs_dir(source_dir, build_dir, sink=None):
   """Generate the information required to build Docs
 
   :param source_dir: Directory of the source
   :param build_dir: Build/Docs directory relative to source_dir
+  :param sink: OutputSink receiving the files. Defaults to the filesystem.
   :return: artifacts that were created
   """
+  sink = sink or FileSystemSink()
   docs_dir = join(source_dir, build_dir)
-  if exists(docs_dir):
-    rmtree(docs_dir)
-  makedirs(docs_dir)
+  sink.reset_directory(docs_dir)
   
   # create a routing path to the next level index.html
   index_filename = join(docs_dir, "index.html")
-  with open(index_filename, "w+") as index_file:
-    index_file.write(
-      "<meta http-equiv=\"refresh\" content=\"0; url=./html/index.html\" />")
+  sink.write(
+    index_filename,
+    "<meta http-equiv=\"refresh\" content=\"0; url=./html/index.html\" />")
 
   # create the necessary .nojekyll file
   jekyll_filename = join(docs_dir, ".nojekyll")
-  Path(jekyll_filename).touch()
+  sink.touch(jekyll_filename)
   
   return {index_filename: True, jekyll_filename: True}
@@ -0,0 +1,184 @@
+"""Sphinx extension recording the build time of every page.
+
+The time to read a document (parsing, including the autodoc directives)
+is measured from `source-read` to `doctree-read`, the time to write it by
+wrapping the `write_doc` method of the builder. Pages are mapped back to
+the package that generated them and the report is written when the build
+finishes, sorted by the total time. Write times are only recorded for
+serial writes (no `-j`), parallel reads are merged into the environment.
+
+Enable the extension with `docu create --build-timing REPORT`, or add
+`autodoc_ext.timing` to the extensions and set `autodoc_ext_timing_report`
+in conf.py.
+"""
+import os
+import csv
+from json import dumps, loads
+from time import perf_counter
+from logging import getLogger
+
+
+log = getLogger()
+
+# Name of the extension in the sphinx configuration
+TIMING_EXTENSION = "autodoc_ext.timing"
+
+# File in the sphinx source directory listing the package names
+PACKAGES_FILENAME = "autodoc_ext_packages.json"
+
+# Columns of the report
+REPORT_FIELDS = (
+    "docname", "package", "read_seconds", "write_seconds", "total_seconds",
+    "bytes"
+)
+
+# Start of the read of the documents in this process
+_read_started = {}
+
+
+def page_package(docname, packages):
+    """Find the package that generated a page. Part pages
+    (`<package>.partN`) and module pages (`<package>.<module>`) belong to
+    the longest package name that prefixes the page name.
+
+    :param docname: Sphinx document name (e.g. `rst_docs/pkg.sub`).
+    :param packages: Set of package names.
+    :return: Package name, None for pages of no package.
+    """
+    name = docname.rsplit("/", 1)[-1]
+    while name:
+        if name in packages:
+            return name
+        name = name.rpartition(".")[0]
+    return None
+
+
+def report_rows(reads, writes, sizes, packages):
+    """Combine the measurements into the rows of the report.
+
+    :param reads: Dictionary of docname to read seconds.
+    :param writes: Dictionary of docname to write seconds.
+    :param sizes: Dictionary of docname to output bytes.
+    :param packages: Set of package names.
+    :return: List of rows (dictionaries of `REPORT_FIELDS`), slowest first.
+    """
+    rows = []
+    for docname in set(reads) | set(writes):
+        read = reads.get(docname, 0.0)
+        write = writes.get(docname, 0.0)
+        rows.append({
+            "docname": docname,
+            "package": page_package(docname, packages),
+            "read_seconds": round(read, 6),
+            "write_seconds": round(write, 6),
+            "total_seconds": round(read + write, 6),
+            "bytes": sizes.get(docname, 0)
+        })
+    return sorted(rows, key=lambda x: (-x["total_seconds"], x["docname"]))
+
+
+def write_report(filename, rows):
+    """Write the report as CSV (`.csv` extension) or JSON.
+
+    :param filename: Name of the report file.
+    :param rows: Rows of the report, see `report_rows`.
+    """
+    if filename.lower().endswith(".csv"):
+        with open(filename, "w", newline="") as report:
+            writer = csv.DictWriter(report, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(filename, "w") as report:
+            report.write(dumps(rows, indent=2))
+    log.info("Build timing report written to {}".format(filename))
+
+
+def _read_seconds(env):
+    """Read times stored in the environment (merged from parallel reads)."""
+    if not hasattr(env, "autodoc_ext_read_seconds"):
+        env.autodoc_ext_read_seconds = {}
+    return env.autodoc_ext_read_seconds
+
+
+def _env_before_read_docs(app, env, docnames):
+    env.autodoc_ext_read_seconds = {}
+
+
+def _source_read(app, docname, source):
+    _read_started[docname] = perf_counter()
+
+
+def _doctree_read(app, doctree):
+    docname = app.env.docname
+    started = _read_started.pop(docname, None)
+    if started is not None:
+        _read_seconds(app.env)[docname] = perf_counter() - started
+
+
+def _env_merge_info(app, env, docnames, other):
+    other_reads = _read_seconds(other)
+    _read_seconds(env).update(
+        {d: other_reads[d] for d in docnames if d in other_reads})
+
+
+def _env_purge_doc(app, env, docname):
+    _read_seconds(env).pop(docname, None)
+
+
+def _builder_inited(app):
+    """Measure every `write_doc` call of the builder."""
+    builder = app.builder
+    builder.autodoc_ext_write_seconds = {}
+    builder.autodoc_ext_bytes = {}
+    write_doc = builder.write_doc
+
+    def timed_write_doc(docname, doctree):
+        started = perf_counter()
+        write_doc(docname, doctree)
+        builder.autodoc_ext_write_seconds[docname] = perf_counter() - started
+        if hasattr(builder, "get_outfilename"):
+            try:
+                builder.autodoc_ext_bytes[docname] = os.path.getsize(
+                    builder.get_outfilename(docname))
+            except OSError:
+                pass
+
+    builder.write_doc = timed_write_doc
+
+
+def _build_finished(app, exception):
+    filename = app.config.autodoc_ext_timing_report
+    if exception is not None or not filename:
+        return
+
+    packages = set()
+    packages_file = os.path.join(app.confdir, PACKAGES_FILENAME)
+    if os.path.exists(packages_file):
+        with open(packages_file, "r") as packages_json:
+            packages = set(loads(packages_json.read()))
+
+    builder = app.builder
+    rows = report_rows(
+        _read_seconds(app.env),
+        getattr(builder, "autodoc_ext_write_seconds", {}),
+        getattr(builder, "autodoc_ext_bytes", {}),
+        packages)
+    write_report(os.path.join(app.confdir, filename), rows)
+
+
+def setup(app):
+    """Register the extension with sphinx."""
+    app.add_config_value("autodoc_ext_timing_report", "", "")
+    app.connect("env-before-read-docs", _env_before_read_docs)
+    app.connect("source-read", _source_read)
+    app.connect("doctree-read", _doctree_read)
+    app.connect("env-merge-info", _env_merge_info)
+    app.connect("env-purge-doc", _env_purge_doc)
+    app.connect("builder-inited", _builder_inited)
+    app.connect("build-finished", _build_finished)
+    return {
+        "version": "1",
+        "parallel_read_safe": True,
+        "parallel_write_safe": True,
+    }
@@ -1,10 +1,21 @@
 import os
-from json import dumps
-import ast
+import sys
+import time
+import tempfile
+import sysconfig
+from importlib.util import find_spec
+from json import dumps, loads
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import partial
+from threading import Lock
 from logging import getLogger
+from .parse import default_parser, public_names
+from .events import timed
 
 
 log = getLogger()
+TREE_FORMAT = "autodoc_ext-tree"
+TREE_FORMAT_VERSION = 4
 
 
 class Node:
@@ -13,18 +24,33 @@ class Node:
     subdirectories, path).
     """
     
-    def __init__(self, name, path=None):
+    def __init__(self, name, path=None, parser=None):
         """Initialize the instance of a Node
 
         :param name: Name of this node/leaf.
         :param path: path in the tree for this instance.
         Defaults to None.
+        :param parser: SourceParser used to summarize the files.
+        Defaults to the shared parser.
         """
         self.name = name
         self.path = path
         self.parent = None
         self.children = []
         self.files = []
+        self.parser = parser or default_parser
+        # summaries provided up front (see `load_tree`), keyed by filename
+        self.summaries = {}
+
+    def summary(self, filename):
+        """Get the summary of one of the files in this instance
+
+        :param filename: Name of the file (without path).
+        :return: Summary dictionary, see `parse.SourceParser`.
+        """
+        if filename in self.summaries:
+            return self.summaries[filename]
+        return self.parser.summary(os.path.join(self.path, filename))
 
     @property
     def all_filenames(self):
@@ -63,16 +89,12 @@ class Node:
         :return: List of classes that were found in the files of this tree.
         """
         classes = []
-        for longfile, shortfile in \
-            self.project_files(self.all_filenames).items():
-
-            with open(longfile, "r") as file_handle:
-                file_data = ast.parse(file_handle.read())
-                classes.extend(
+        for filename in self.files:
+            shortfile = self.project_files([filename])[filename]
+            classes.extend(
                 [
-                    "{}::{}".format(shortfile, str(found_cls.name))
-                    for found_cls in ast.walk(file_data)
-                    if isinstance(found_cls, ast.ClassDef)
+                    "{}::{}".format(shortfile, found_cls)
+                    for found_cls in self.summary(filename)["classes"]
                 ]
             )
         return classes
@@ -110,6 +132,51 @@ class Node:
             "classes": classes
         }
             
+    @property
+    def module_summaries(self):
+        """Get the summaries of the files of this instance by module name.
+        `__init__.py` is also the module of the package itself.
+
+        :return: Dictionary of module name to summary.
+        """
+        summaries = {}
+        for filename, module in self.project_files(self.files).items():
+            summaries[module] = self.summary(filename)
+            if filename == "__init__.py":
+                summaries[self.sphinx_name] = summaries[module]
+        return summaries
+
+    @property
+    def public_templates(self):
+        """Create the templates of the public API of this node, see
+        `templates`. Only the names exported by the modules (see
+        `parse.public_names`) are documented: private modules, modules
+        without exports and nested classes are left out, and no class
+        templates are created.
+
+        :return: templates, with the exported `members` of every module
+        and the `base_members` exported by `__init__.py`.
+        """
+        modules = []
+        members = {}
+        base_members = []
+        for filename in self.files:
+            names = public_names(self.summary(filename))
+            if filename == "__init__.py":
+                base_members = names
+            elif not filename.startswith("_") and names:
+                module = self.project_files([filename])[filename]
+                modules.append(module)
+                members[module] = names
+
+        return {
+            "base": self.sphinx_name,
+            "base_members": base_members,
+            "modules": modules,
+            "members": members,
+            "classes": []
+        }
+
     @property
     def json(self):
         """JSON formatted dictionary object for this node
@@ -141,13 +208,443 @@ class Node:
         return dumps(self.json, indent=4)
 
 
-def generate_tree(directory=".", parent=0, exclusions=[]):
+def package_names(tree):
+    """Get the package (page) name of every node in the tree. The names
+    match the names of the pages created by `templates.generate_rst`.
+
+    :param tree: Node of the project.
+    :return: List of tuples of package name and node, in page order.
+    """
+    names = []
+    stack = [(tree, None)]
+    while stack:
+        node, parent = stack.pop()
+        name = parent + "." + node.name if parent is not None else node.name
+        names.append((name, node))
+        for child in reversed(node.children):
+            stack.append((child, name))
+    return names
+
+
+def changed_packages(tree, paths):
+    """Find the packages affected by changed files: the package of every
+    changed python file and all of its ancestors. Files of directories
+    that no longer exist are attributed to the nearest existing package.
+
+    :param tree: Node of the project.
+    :param paths: Paths of the changed files, relative to the directory
+    of the project, with `/` separators.
+    :return: Set of package names, see `package_names`.
+    """
+    names = {name for name, _ in package_names(tree)}
+    packages = {tree.name}
+    for path in paths:
+        if not path.endswith(".py"):
+            continue
+        components = [tree.name] + path.split("/")[:-1]
+        while ".".join(components) not in names:
+            components.pop()
+        for index in range(1, len(components) + 1):
+            packages.add(".".join(components[:index]))
+    return packages
+
+
+def prune_tree(tree, packages):
+    """Copy the tree keeping only the nodes of the packages. The toctrees
+    of the remaining pages only reference pages that are generated. The
+    root of the tree is always kept and the files (and summaries) of the
+    nodes are shared with the original tree.
+
+    :param tree: Node of the project.
+    :param packages: Package names to keep, including their ancestors
+    (see `changed_packages`).
+    :return: Root Node of the copy.
+    """
+    def _copy(node, name):
+        """Copy a node and the children that are kept [inner function]"""
+        copy = Node(node.name, path=node.path, parser=node.parser)
+        copy.parent = node.parent
+        copy.files = node.files
+        copy.summaries = node.summaries
+        for child in node.children:
+            child_name = name + "." + child.name
+            if child_name in packages:
+                copy.children.append(_copy(child, child_name))
+        return copy
+
+    return _copy(tree, tree.name)
+
+
+def _is_stdlib(name):
+    """Determine if the top level module name is part of the standard
+    library.
+
+    :param name: Top level module name.
+    :return: True when the module ships with python.
+    """
+    if hasattr(sys, "stdlib_module_names"):
+        return name in sys.stdlib_module_names
+    if name in sys.builtin_module_names:
+        return True
+    try:
+        spec = find_spec(name)
+    except (ImportError, ValueError):
+        return False
+    if spec is None or spec.origin is None:
+        return False
+    if spec.origin in ("built-in", "frozen"):
+        return True
+    stdlib = os.path.normcase(sysconfig.get_paths()["stdlib"])
+    origin = os.path.normcase(spec.origin)
+    return origin.startswith(stdlib) and "site-packages" not in origin
+
+
+def external_imports(tree, project=None):
+    """Find the imports of the project that do not resolve to modules or
+    packages inside of the tree and are not part of the standard library.
+    These are the third party dependencies that autodoc can mock.
+
+    :param tree: Node of the project. Only the files of this tree are
+    summarized.
+    :param project: Node of the whole project when `tree` is a part of it
+    (see `prune_tree`), the imports of its packages are internal. Defaults
+    to `tree`.
+    :return: Sorted list of top level module names.
+    """
+    project = project or tree
+    internal = {project.name}
+    internal.update(child.name for child in project.children)
+    internal.update(f[:-len(".py")] for f in project.files)
+
+    imports = set()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        for filename in node.files:
+            imports.update(node.summary(filename)["imports"])
+        stack.extend(node.children)
+
+    return sorted(
+        name for name in imports
+        if name not in internal and not _is_stdlib(name)
+    )
+
+
+def export_tree(tree, output):
+    """Export the tree in a flat, indexed layout. Every node is written as
+    a single JSON line containing the node id, the id of the parent node,
+    the files and the summaries of the files. The tree is walked
+    iteratively and every node is written once, even when it is reachable
+    more than once.
+
+    :param tree: Node that will be exported.
+    :param output: Filename or writable text stream.
+    :return: Number of nodes that were exported.
+    """
+    if isinstance(output, str):
+        with open(output, "w+") as stream:
+            return export_tree(tree, stream)
+
+    output.write(dumps(
+        {"format": TREE_FORMAT, "version": TREE_FORMAT_VERSION}) + "\n")
+
+    visited = set()
+    count = 0
+    stack = [(tree, None)]
+    while stack:
+        node, parent_id = stack.pop()
+        if id(node) in visited:
+            log.warning("Node {} was already exported, skipping ...".format(
+                node.name))
+            continue
+        visited.add(id(node))
+
+        node_id = count
+        count += 1
+        output.write(dumps({
+            "id": node_id,
+            "parent_id": parent_id,
+            "name": node.name,
+            "path": node.path,
+            "module": node.parent,
+            "files": node.files,
+            "summaries": {f: node.summary(f) for f in node.files}
+        }) + "\n")
+
+        # reversed so that the children are exported in order
+        for child in reversed(node.children):
+            stack.append((child, node_id))
+    return count
+
+
+def load_tree(source, parser=None):
+    """Rebuild a tree that was exported with `export_tree`. The summaries
+    of the files are restored so no file is read or parsed again.
+
+    :param source: Filename or readable text stream.
+    :param parser: SourceParser given to the nodes.
+    :return: The root Node of the tree.
+    """
+    if isinstance(source, str):
+        with open(source, "r") as stream:
+            return load_tree(stream, parser=parser)
+
+    header = loads(source.readline())
+    if header.get("format") != TREE_FORMAT or \
+            header.get("version") != TREE_FORMAT_VERSION:
+        raise ValueError("Unsupported tree export: {}".format(header))
+
+    nodes = {}
+    root = None
+    for line in source:
+        if not line.strip():
+            continue
+        record = loads(line)
+        node = Node(record["name"], path=record["path"], parser=parser)
+        node.parent = record["module"]
+        node.files = record["files"]
+        node.summaries = record["summaries"]
+        nodes[record["id"]] = node
+
+        if record["parent_id"] is None:
+            root = node
+        else:
+            nodes[record["parent_id"]].children.append(node)
+    return root
+
+
+def _tree_node(full_dir, parent, parser):
+    """Create the (empty) node of a directory.
+
+    :param full_dir: Path of the directory.
+    :param parent: parent directory depth.
+    :param parser: SourceParser given to the node.
+    :return: Node of the directory.
+    """
+    split_dir = full_dir.split("/")
+    base_dir_name = split_dir[-1]
+    log.debug("Setting base directory name to {}".format(base_dir_name))
+
+    leaf = Node(base_dir_name, path=full_dir, parser=parser)
+    leaf.parent = ".".join(split_dir[-(parent+1):])
+    return leaf
+
+
+def _list_directory(full_dir, exclusions):
+    """List the python files and the subdirectories of a directory. Hidden
+    files, links, non python files and exclusions are skipped. The
+    entries are read with `os.scandir`, so the type of most entries is
+    known without an additional stat call, and sorted by name so that the
+    tree does not depend on the order of the filesystem.
+
+    :param full_dir: Path of the directory.
+    :param exclusions: Exclude files/directories matching these names
+    :return: Tuple of the filenames and the paths of the subdirectories.
+    """
+    log.debug("  {} ...".format(full_dir))
+    files = []
+    subdirectories = []
+    with timed("tree.walk", path=full_dir) as walk:
+        with os.scandir(full_dir) as entries:
+            for entry in sorted(entries, key=lambda x: x.name):
+                filename = entry.name
+                log.debug("    {} ... ".format(filename))
+
+                if filename.startswith("."):
+                    log.warning("Hidden file {}, skipping ...".format(filename))
+                    continue
+
+                if entry.is_file() and not filename.endswith(".py"):
+                    continue
+                elif entry.is_symlink():
+                    log.warning("  Found link: {}, skipping ...".format(filename))
+                    continue
+                elif filename in exclusions:
+                    log.warning("  Found exclusion: {}, skipping ...".format(filename))
+                    continue
+
+                log.debug(entry.path)
+                if entry.is_dir():
+                    log.debug("  Found directory".format(filename))
+                    subdirectories.append(entry.path)
+                else:
+                    log.debug("  Found file: {}".format(filename))
+                    files.append(filename)
+        walk["files"] = len(files)
+        walk["directories"] = len(subdirectories)
+    return files, subdirectories
+
+
+class TreeSnapshot:
+    """Listings of the directories of a previous walk. A listing is keyed
+    by the modification time and inode of its directory and is reused
+    while both are unchanged, so only directories with added, removed or
+    renamed entries are listed again. Every directory is still stat'ed:
+    a change deep in the tree does not update the modification time of
+    its ancestors. Directories modified within `RACY_SECONDS` of the walk
+    are not trusted, a later change could keep the same time.
+
+    The summaries memoized by the parser are saved with the snapshot, see
+    `SourceParser.import_summaries`, so unchanged files are not read again
+    either.
+    """
+
+    FORMAT = "autodoc_ext-snapshot"
+    VERSION = 3
+    RACY_SECONDS = 2
+
+    def __init__(self, exclusions=[], directories=None):
+        """Initialize the instance of a TreeSnapshot
+
+        :param exclusions: Exclusions of the walk, the listings depend on
+        them.
+        :param directories: Dictionary of directory to listing.
+        """
+        self.exclusions = list(exclusions)
+        self.directories = directories or {}
+        self.summaries = {}
+        self.listed = 0
+        self.reused = 0
+        self._visited = {}
+        self._lock = Lock()
+
+    def list_directory(self, full_dir):
+        """List a directory, see `_list_directory`. The listing of the
+        snapshot is used when the directory is unchanged.
+
+        :param full_dir: Path of the directory.
+        :return: Tuple of the filenames and the paths of the subdirectories.
+        """
+        stat = os.stat(full_dir)
+        key = [stat.st_mtime_ns, stat.st_ino]
+        listing = self.directories.get(full_dir)
+        if listing is not None and listing["key"] == key:
+            with self._lock:
+                self.reused += 1
+                self._visited[full_dir] = listing
+            return list(listing["files"]), [
+                os.path.join(full_dir, d) for d in listing["subdirectories"]]
+
+        files, subdirectories = _list_directory(full_dir, self.exclusions)
+        if time.time() - stat.st_mtime_ns / 1e9 < self.RACY_SECONDS:
+            key = None
+        with self._lock:
+            self.listed += 1
+            self._visited[full_dir] = {
+                "key": key,
+                "files": files,
+                "subdirectories": [
+                    os.path.basename(d) for d in subdirectories]
+            }
+        return list(files), subdirectories
+
+    @classmethod
+    def load(cls, filename, exclusions=[]):
+        """Read a snapshot. A missing or incompatible snapshot, or one
+        taken with other exclusions, results in an empty snapshot.
+
+        :param filename: Name of the snapshot file.
+        :param exclusions: Exclusions of the walk.
+        :return: TreeSnapshot
+        """
+        snapshot = cls(exclusions)
+        try:
+            with open(filename, "r") as snapshot_file:
+                data = loads(snapshot_file.read())
+        except (IOError, OSError, ValueError):
+            log.info("No usable tree snapshot in {}".format(filename))
+            return snapshot
+
+        if data.get("format") != cls.FORMAT or \
+                data.get("version") != cls.VERSION or \
+                data.get("exclusions") != snapshot.exclusions:
+            log.info("Tree snapshot {} is outdated, ignoring ...".format(
+                filename))
+            return snapshot
+        snapshot.directories = data["directories"]
+        snapshot.summaries = data["summaries"]
+        return snapshot
+
+    def save(self, filename, parser=None):
+        """Atomically write the listings of the last walk and the
+        summaries of the parser. Directories that were not visited are
+        dropped.
+
+        :param filename: Name of the snapshot file.
+        :param parser: SourceParser whose summaries are saved.
+        """
+        # only the (settled) files of the walk, deleted files are dropped
+        summaries = {}
+        if parser is not None:
+            now = time.time()
+            for source, entry in parser.export_summaries().items():
+                directory, name = os.path.split(source)
+                listing = self._visited.get(directory)
+                if listing is not None and name in listing["files"] and \
+                        now - entry[1] / 1e9 >= self.RACY_SECONDS:
+                    summaries[source] = entry
+        data = dumps({
+            "format": self.FORMAT,
+            "version": self.VERSION,
+            "exclusions": self.exclusions,
+            "directories": self._visited,
+            "summaries": summaries
+        }, sort_keys=True)
+
+        directory = os.path.dirname(os.path.abspath(filename))
+        handle, temp_name = tempfile.mkstemp(dir=directory, prefix=".tmp")
+        with os.fdopen(handle, "w") as snapshot_file:
+            snapshot_file.write(data)
+        os.replace(temp_name, filename)
+        log.info("Tree snapshot written to {} ({} listed, {} reused)".format(
+            filename, self.listed, self.reused))
+
+
+def _generate_tree_concurrent(full_dir, parent, parser, workers,
+                              list_directory):
+    """Generate the tree, listing the directories on a thread pool. A
+    directory is listed as soon as its parent was listed, so siblings
+    (and cousins) are listed concurrently. The children of every node are
+    added in listing order, the tree is identical to the serial walk.
+
+    :param full_dir: Path of the directory of the project.
+    :param parent: parent directory depth.
+    :param parser: SourceParser given to every node.
+    :param workers: Maximum number of concurrent listings.
+    :param list_directory: Function listing a directory, see
+    `_list_directory`.
+    :return: A tree (Node) containing all information from the walk
+    """
+    root = _tree_node(full_dir, parent, parser)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(list_directory, full_dir): (root, parent)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                node, depth = pending.pop(future)
+                node.files, subdirectories = future.result()
+                for subdirectory in subdirectories:
+                    child = _tree_node(subdirectory, depth+1, parser)
+                    node.children.append(child)
+                    pending[pool.submit(list_directory, subdirectory)] = \
+                        (child, depth+1)
+    return root
+
+
+def generate_tree(directory=".", parent=0, exclusions=[], parser=None,
+                  workers=None, snapshot=None):
     """Generate the tree by walking the directory structure and creating
     a node for each directory that has been found.
 
     :param directory: Directory where all files for the project will reside.
     :param parent: parent directory depth.
     :param exclusions: Exclude files/directories matching these names
+    :param parser: SourceParser given to every node. Defaults to the
+    shared parser.
+    :param workers: List up to this many directories concurrently (for
+    filesystems with a high latency, e.g. NFS). Defaults to None (serial).
+    :param snapshot: TreeSnapshot of a previous walk, unchanged directories
+    are not listed again. The snapshot uses its own exclusions.
     :return: A tree (Node) containing all information from the directory walk
     """
     log.info("Generating tree info for the directory {}".format(directory))
@@ -157,38 +654,19 @@ def generate_tree(directory=".", parent=0, exclusions=[]):
     else:
         full_dir = directory
 
-    split_dir = full_dir.split("/")
-    base_dir_name = split_dir[-1]
-    log.debug("Setting base directory name to {}".format(base_dir_name))
-
-    leaf = Node(base_dir_name, path=full_dir)
-    leaf.parent = ".".join(split_dir[-(parent+1):])
-
-    log.debug("  {} ...".format(full_dir))
-    for filename in os.listdir(full_dir):
-
-        log.debug("    {} ... ".format(filename))
-        
-        if filename.startswith("."):
-            log.warning("Hidden file {}, skipping ...".format(filename))
-            continue
-
-        full_filename = os.path.join(full_dir, filename)
-        if os.path.isfile(full_filename) and not filename.endswith(".py"):
-            continue
-        elif os.path.islink(full_filename):
-            log.warning("  Found link: {}, skipping ...".format(filename))
-            continue
-        elif filename in exclusions:
-            log.warning("  Found exclusion: {}, skipping ...".format(filename))
-            continue
-
-        log.debug(full_filename)
-        if os.path.isdir(full_filename):
-            log.debug("  Found directory".format(filename))
-            leaf.children.append(generate_tree(
-                full_filename, parent=parent+1, exclusions=exclusions))
-        else:
-            log.debug("  Found file: {}".format(filename))
-            leaf.files.append(filename)
+    if snapshot is not None:
+        list_directory = snapshot.list_directory
+    else:
+        list_directory = partial(_list_directory, exclusions=exclusions)
+
+    if workers:
+        return _generate_tree_concurrent(
+            full_dir, parent, parser, workers, list_directory)
+
+    leaf = _tree_node(full_dir, parent, parser)
+    leaf.files, subdirectories = list_directory(full_dir)
+    for full_filename in subdirectories:
+        leaf.children.append(generate_tree(
+            full_filename, parent=parent+1, exclusions=exclusions,
+            parser=parser, snapshot=snapshot))
     return leaf
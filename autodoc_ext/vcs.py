@@ -0,0 +1,220 @@
+import os
+import subprocess
+from logging import getLogger
+from .tree import Node
+from .parse import default_parser
+
+
+log = getLogger()
+
+# Mode of symbolic links in git trees
+GIT_LINK_MODE = "120000"
+
+
+class GitRepository:
+    """Read the trees and blobs of a local git repository straight from
+    the object database. Nothing is checked out and the working tree is
+    never touched. Blobs are read through a single long running
+    `git cat-file --batch` process.
+    """
+
+    def __init__(self, path="."):
+        """Initialize the instance of a GitRepository
+
+        :param path: Any directory inside of the repository.
+        """
+        self.top = self._git(
+            "rev-parse", "--show-toplevel", cwd=path).decode().strip()
+        self.blobs_read = 0
+        self._batch = None
+
+    @staticmethod
+    def _git(*args, cwd=None):
+        """Run a git command.
+
+        :param args: Arguments of the git command.
+        :param cwd: Directory the command runs in.
+        :return: bytes written to stdout.
+        """
+        try:
+            return subprocess.check_output(
+                ("git",) + args, cwd=cwd, stderr=subprocess.PIPE)
+        except subprocess.CalledProcessError as error:
+            raise ValueError("git {} failed: {}".format(
+                " ".join(args), error.stderr.decode(errors="replace").strip()))
+
+    def prefix(self, directory):
+        """Path of a directory relative to the top of the repository.
+
+        :param directory: Directory inside of the repository.
+        :return: Relative path using `/` separators, "" for the top.
+        """
+        relative = os.path.relpath(
+            os.path.realpath(directory), os.path.realpath(self.top))
+        if relative.startswith(".."):
+            raise ValueError("{} is not inside of {}".format(
+                directory, self.top))
+        return "" if relative == "." else relative.replace(os.sep, "/")
+
+    def resolve(self, ref):
+        """Get the commit id of a reference (tag, branch, commit).
+
+        :param ref: Reference name.
+        :return: Commit id.
+        """
+        return self._git(
+            "rev-parse", "--verify", ref + "^{commit}",
+            cwd=self.top).decode().strip()
+
+    def ls_tree(self, ref, prefix=""):
+        """List the entries of the tree of a reference recursively,
+        including the subtrees.
+
+        :param ref: Reference name.
+        :param prefix: Only list the entries below this path.
+        :return: List of tuples of mode, type, object id and path.
+        """
+        args = ["ls-tree", "-r", "-t", "-z", ref]
+        if prefix:
+            args.extend(["--", prefix])
+        entries = []
+        for record in self._git(*args, cwd=self.top).split(b"\0"):
+            if not record:
+                continue
+            info, path = record.split(b"\t", 1)
+            mode, kind, object_id = info.decode().split()
+            entries.append((mode, kind, object_id, path.decode()))
+        return entries
+
+    def changed_paths(self, ref, prefix=""):
+        """Paths that changed since the merge base of the reference and
+        HEAD: committed, uncommitted and untracked changes, deletions
+        included.
+
+        :param ref: Reference name (e.g. `origin/main`).
+        :param prefix: Only list the paths below this path.
+        :return: Sorted list of paths relative to the top of the repository.
+        """
+        base = self._git(
+            "merge-base", ref, "HEAD", cwd=self.top).decode().strip()
+        paths = ["--", prefix] if prefix else []
+        output = self._git(
+            "diff", "--name-only", "--no-renames", "-z", base, *paths,
+            cwd=self.top)
+        output += b"\0" + self._git(
+            "ls-files", "--others", "--exclude-standard", "-z", *paths,
+            cwd=self.top)
+        return sorted({path.decode() for path in output.split(b"\0") if path})
+
+    def blob(self, object_id):
+        """Read the contents of a blob.
+
+        :param object_id: Object id of the blob.
+        :return: bytes of the blob.
+        """
+        if self._batch is None:
+            self._batch = subprocess.Popen(
+                ["git", "cat-file", "--batch"], cwd=self.top,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._batch.stdin.write(object_id.encode("ascii") + b"\n")
+        self._batch.stdin.flush()
+        header = self._batch.stdout.readline().split()
+        if len(header) != 3 or header[1] != b"blob":
+            raise ValueError("Failed to read blob {}".format(object_id))
+        data = self._batch.stdout.read(int(header[2]))
+        # every object is followed by a newline
+        self._batch.stdout.read(1)
+        self.blobs_read += 1
+        return data
+
+    def close(self):
+        """Stop the process reading the blobs."""
+        if self._batch is not None:
+            self._batch.stdin.close()
+            self._batch.wait()
+            self._batch = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def git_tree(repository, ref, directory=".", exclusions=[], parser=None,
+             summaries=None, blobs=None):
+    """Generate the tree of a directory at a revision of the repository.
+    The same rules as `tree.generate_tree` apply (hidden files, links,
+    non python files and exclusions are skipped). Every file is summarized
+    once per blob: summaries of blobs that are found in `summaries` are
+    reused, so unchanged files are never parsed again for another
+    revision.
+
+    :param repository: GitRepository containing the directory.
+    :param ref: Reference (tag, branch, commit) of the revision.
+    :param directory: Directory of the project in the working tree.
+    :param exclusions: Exclude files/directories matching these names
+    :param parser: SourceParser summarizing the blobs. Defaults to the
+    shared parser.
+    :param summaries: Dictionary of blob id to summary, shared between
+    revisions. Defaults to a new dictionary.
+    :param blobs: Dictionary receiving the contents of the blobs read to
+    summarize them, by blob id.
+    :return: Tuple of the tree (Node) and a dictionary of the path of
+    every file, relative to the parent of the project, to its blob id.
+    """
+    parser = parser or default_parser
+    summaries = {} if summaries is None else summaries
+    prefix = repository.prefix(directory)
+    base_name = os.path.basename(os.path.realpath(directory))
+    log.info("Generating tree info for {} at {}".format(base_name, ref))
+
+    root = Node(base_name, path="{}:{}".format(ref, prefix), parser=parser)
+    root.parent = base_name
+    nodes = {prefix: root}
+    files = {}
+    for mode, kind, object_id, path in repository.ls_tree(ref, prefix):
+        if prefix and not path.startswith(prefix + "/"):
+            continue
+        parent_path, _, name = path.rpartition("/")
+        parent = nodes.get(parent_path)
+        if parent is None:
+            # the parent directory was skipped
+            continue
+
+        if name.startswith("."):
+            log.warning("Hidden file {}, skipping ...".format(name))
+            continue
+        elif kind == "blob" and not name.endswith(".py"):
+            continue
+        elif mode == GIT_LINK_MODE:
+            log.warning("  Found link: {}, skipping ...".format(name))
+            continue
+        elif name in exclusions:
+            log.warning("  Found exclusion: {}, skipping ...".format(name))
+            continue
+
+        if kind == "tree":
+            node = Node(name, path="{}:{}".format(ref, path), parser=parser)
+            node.parent = "{}.{}".format(parent.parent, name)
+            parent.children.append(node)
+            nodes[path] = node
+        elif kind == "blob":
+            if object_id not in summaries:
+                data = repository.blob(object_id)
+                if blobs is not None:
+                    blobs[object_id] = data
+                summaries[object_id] = parser.summary_of(
+                    "{}:{}".format(ref, path), data)
+            parent.files.append(name)
+            parent.summaries[name] = summaries[object_id]
+            relative = path[len(prefix) + 1:] if prefix else path
+            files["{}/{}".format(base_name, relative)] = object_id
+        else:
+            log.warning("  Found submodule: {}, skipping ...".format(name))
+
+    # same order as `tree.generate_tree` (git sorts directories as "name/")
+    for node in nodes.values():
+        node.files.sort()
+        node.children.sort(key=lambda x: x.name)
+    return root, files
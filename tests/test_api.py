@@ -0,0 +1,125 @@
+import pytest
+import sys
+import tarfile
+import zipfile
+from autodoc_ext import build_plan, MemorySink, ArchiveSink
+from autodoc_ext.artifacts import ARTIFACTS_FILENAME
+from autodoc_ext.__main__ import main
+from os import remove
+from os.path import exists, join, dirname, abspath
+
+
+PACKAGE_DIR = join(dirname(dirname(abspath(__file__))), "autodoc_ext")
+
+
+def test_build_plan_in_memory():
+    '''Generate everything in memory, nothing is written to disk'''
+    plan = build_plan(PACKAGE_DIR, PROJECT="TEST", SOURCE_DIR="memory_out")
+
+    assert not exists("memory_out")
+    assert isinstance(plan.sink, MemorySink)
+    assert plan.tree.name == "autodoc_ext"
+    for name in ("conf.py", "index.rst", "rst_docs/autodoc_ext.rst",
+                 "rst_docs/modules.rst", "docs/index.html"):
+        assert join("memory_out", name) in plan.pages
+    assert "autodoc_ext.tree" in plan.pages["memory_out/rst_docs/autodoc_ext.rst"]
+    assert plan.artifacts_file in plan.pages
+    assert "memory_out/rst_docs/autodoc_ext.rst" in plan.artifacts
+
+
+def test_build_plan_zip_sink():
+    '''Stream all generated files into a zip archive'''
+    with ArchiveSink("plan.zip", root="zip_out") as sink:
+        build_plan(PACKAGE_DIR, sink=sink, SOURCE_DIR="zip_out")
+
+    with zipfile.ZipFile("plan.zip") as archive:
+        names = archive.namelist()
+    remove("plan.zip")
+
+    assert not exists("zip_out")
+    assert "conf.py" in names
+    assert "rst_docs/autodoc_ext.rst" in names
+
+
+def test_build_plan_tar_sink():
+    '''Stream all generated files into a compressed tar archive'''
+    with ArchiveSink("plan.tar.gz", root="tar_out") as sink:
+        build_plan(PACKAGE_DIR, sink=sink, SOURCE_DIR="tar_out")
+
+    with tarfile.open("plan.tar.gz") as archive:
+        names = archive.getnames()
+    remove("plan.tar.gz")
+
+    assert "index.rst" in names
+    assert "docs/.nojekyll" in names
+    assert ARTIFACTS_FILENAME in names
+
+
+@pytest.mark.parametrize("extension", [".zip", ".tar.gz"])
+def test_archive_sink_copy(tmp_path, extension):
+    '''Copies read the same contents as the file they copy'''
+    target = str(tmp_path / ("copy" + extension))
+    with ArchiveSink(target, root="out") as sink:
+        sink.write("out/a.py", b"data")
+        sink.copy("out/a.py", "out/b.py")
+
+    if extension == ".zip":
+        with zipfile.ZipFile(target) as archive:
+            assert archive.read("b.py") == b"data"
+    else:
+        with tarfile.open(target) as archive:
+            assert archive.extractfile("b.py").read() == b"data"
+
+
+def test_create_emit_archive(monkeypatch):
+    '''The create command only produces the archive, no loose files'''
+    monkeypatch.setattr(sys, "argv", [
+        "docu", "create", "TEST", "-d", PACKAGE_DIR, "-s", "archive_out",
+        "--emit-archive", "create.tar"
+    ])
+    main()
+
+    with tarfile.open("create.tar") as archive:
+        names = archive.getnames()
+    remove("create.tar")
+
+    assert not exists("archive_out")
+    assert "Makefile" in names
+    assert "rst_docs/autodoc_ext.tree.rst" not in names
+    assert "rst_docs/autodoc_ext.rst" in names
+    assert ARTIFACTS_FILENAME in names
+
+
+def test_zstd_archive():
+    '''Zstandard compressed tar archives need the optional dependency'''
+    zstandard = pytest.importorskip("zstandard")
+    with ArchiveSink("plan.tar.zst", root="zst_out") as sink:
+        sink.write("zst_out/index.rst", "index")
+
+    with open("plan.tar.zst", "rb") as compressed:
+        reader = zstandard.ZstdDecompressor().stream_reader(compressed)
+        with tarfile.open(fileobj=reader, mode="r|") as archive:
+            names = archive.getnames()
+    remove("plan.tar.zst")
+
+    assert names == ["index.rst"]
+
+
+def test_build_plan_tree_snapshot(tmp_path):
+    '''The tree snapshot is written and used by the next run'''
+    snapshot_file = str(tmp_path / "snapshot.json")
+    first = build_plan(PACKAGE_DIR, SOURCE_DIR="out", tree_snapshot=snapshot_file)
+    assert exists(snapshot_file)
+    second = build_plan(PACKAGE_DIR, SOURCE_DIR="out", tree_snapshot=snapshot_file)
+    assert first.pages == second.pages
+
+
+def test_parse_report_warning(caplog):
+    '''The report of the slowest and largest files is a warning when a
+    size limit or time budget is set'''
+    with caplog.at_level("WARNING"):
+        build_plan(PACKAGE_DIR, SOURCE_DIR="out", max_file_bytes=1000)
+    messages = [r.getMessage() for r in caplog.records
+                if r.levelname == "WARNING"]
+    assert "Slowest source files:" in messages
+    assert "Largest source files:" in messages
@@ -93,6 +93,10 @@ def test_all_defaults():
     assert results["STATIC_PATHS"] == []
     assert results["SOURCE_DIR"] == "."
     assert results["BUILD_DIR"] == "docs"
+    assert results["MOCK_IMPORTS"] == []
+    assert results["INTERSPHINX_MAPPING"] == {}
+    assert results["TIMING_REPORT"] == ""
+    assert results["EXTRA_PATHS"] == []
     
 
 def test_all_set_no_defaults():
@@ -108,7 +112,13 @@ def test_all_set_no_defaults():
         "THEME": "TEST THEME",
         "STATIC_PATHS": ["_STATIC"],
         "SOURCE_DIR": "src",
-        "BUILD_DIR": "build"
+        "BUILD_DIR": "build",
+        "MOCK_IMPORTS": ["numpy"],
+        "INTERSPHINX_MAPPING": {
+            "python": ("https://docs.python.org/3", "_intersphinx/python.inv")
+        },
+        "TIMING_REPORT": "build_timing.csv",
+        "EXTRA_PATHS": ["_extra"]
     }
     
     results = check_args(**predata)
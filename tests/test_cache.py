@@ -0,0 +1,49 @@
+import os
+import time
+from autodoc_ext import build_plan
+from autodoc_ext.cache import ContentCache, content_key
+from os.path import join, dirname, abspath
+
+
+PACKAGE_DIR = join(dirname(dirname(abspath(__file__))), "autodoc_ext")
+
+
+def test_put_get(tmp_path):
+    '''Entries are found by namespace and key'''
+    cache = ContentCache(str(tmp_path))
+    key = content_key("a", "b")
+
+    assert cache.get("test", key) is None
+    cache.put("test", key, b"data")
+    assert cache.get("test", key) == b"data"
+    assert cache.get("other", key) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert content_key("a", "b") != content_key("ab")
+
+
+def test_prune_lru(tmp_path):
+    '''The least recently used entries are evicted first'''
+    cache = ContentCache(str(tmp_path), max_bytes=8)
+    keys = [content_key(i) for i in range(3)]
+    for age, key in enumerate(keys):
+        cache.put("test", key, b"1234")
+        path = cache._path("test", key)
+        os.utime(path, (time.time() - 100 + age, time.time() - 100 + age))
+    # refresh the oldest entry
+    cache.get("test", keys[0])
+
+    assert cache.prune() == 1
+    assert cache.get("test", keys[1]) is None
+    assert cache.get("test", keys[0]) == b"1234"
+    assert cache.get("test", keys[2]) == b"1234"
+
+
+def test_build_plan_reuses_cache(tmp_path):
+    '''A second run is served from the cache and produces the same pages'''
+    cache_dir = str(tmp_path / "cache")
+    first = build_plan(PACKAGE_DIR, cache_dir=cache_dir)
+    second = build_plan(PACKAGE_DIR, cache_dir=cache_dir)
+
+    assert first.pages == second.pages
+    assert os.listdir(join(cache_dir, "summaries"))
+    assert os.listdir(join(cache_dir, "pages"))
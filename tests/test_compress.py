@@ -0,0 +1,68 @@
+import gzip
+import os
+import pytest
+from autodoc_ext.artifacts import log_artifacts, update_artifacts, destroy
+from autodoc_ext.compress import precompress
+
+
+@pytest.fixture
+def site(tmp_path):
+    '''Built site with compressible, tiny and binary files'''
+    html = tmp_path / "docs" / "html"
+    (html / "_static").mkdir(parents=True)
+    (html / "index.html").write_text("<p>documentation</p>\n" * 100)
+    (html / "_static" / "searchindex.js").write_text("Search.setIndex({});" * 50)
+    (html / "_static" / "tiny.css").write_text("p {}")
+    (html / "_static" / "logo.png").write_bytes(b"\x89PNG" * 200)
+    return tmp_path
+
+
+def test_precompress(site):
+    '''Compressible files receive a gzip sibling'''
+    html = site / "docs" / "html"
+    siblings = precompress(str(site / "docs"), formats=("gz",))
+
+    assert siblings == [
+        str(html / "_static" / "searchindex.js.gz"),
+        str(html / "index.html.gz")
+    ]
+    with gzip.open(str(html / "index.html.gz"), "rb") as compressed:
+        assert compressed.read() == (html / "index.html").read_bytes()
+    assert os.stat(str(html / "index.html.gz")).st_mtime_ns == \
+        os.stat(str(html / "index.html")).st_mtime_ns
+
+
+def test_precompress_up_to_date(site, caplog):
+    '''Siblings are only written again when the file changed'''
+    html = site / "docs" / "html"
+    precompress(str(site / "docs"), formats=("gz",))
+    (html / "index.html").write_text("<p>rebuilt</p>\n" * 100)
+
+    caplog.set_level("INFO")
+    siblings = precompress(str(site / "docs"), formats=("gz",))
+    assert "Wrote 1 compressed files" in caplog.text
+    assert "1 were up to date" in caplog.text
+    with gzip.open(str(html / "index.html.gz"), "rb") as compressed:
+        assert compressed.read() == (html / "index.html").read_bytes()
+    assert len(siblings) == 2
+
+
+def test_precompress_brotli(site):
+    '''Brotli siblings are written when the package is installed'''
+    brotli = pytest.importorskip("brotli")
+    html = site / "docs" / "html"
+    precompress(str(site / "docs"), formats=("br",))
+    assert brotli.decompress((html / "index.html.br").read_bytes()) == \
+        (html / "index.html").read_bytes()
+
+
+def test_precompress_artifacts(site):
+    '''Siblings recorded in the artifacts file are removed by clean'''
+    source = str(site)
+    log_artifacts(source, {}, hide_file=False)
+    siblings = precompress(str(site / "docs"), formats=("gz",))
+    update_artifacts(source, {filename: False for filename in siblings})
+
+    destroy(source)
+    assert not any(os.path.exists(filename) for filename in siblings)
+    assert (site / "docs" / "html" / "index.html").exists()
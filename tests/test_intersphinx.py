@@ -0,0 +1,131 @@
+import os
+import time
+import pytest
+from io import BytesIO
+from urllib.error import URLError
+from autodoc_ext import build_plan
+from autodoc_ext import intersphinx
+from autodoc_ext.intersphinx import InventoryCache, parse_intersphinx
+from os.path import join, dirname, abspath
+
+
+PACKAGE_DIR = join(dirname(dirname(abspath(__file__))), "autodoc_ext")
+PYTHON_URL = "https://docs.python.org/3"
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    '''Every request fails, the requested URLs are recorded'''
+    requests = []
+
+    def urlopen(url, timeout=None):
+        requests.append(url)
+        raise URLError("network is unreachable")
+
+    monkeypatch.setattr(intersphinx, "urlopen", urlopen)
+    return requests
+
+
+def test_parse_intersphinx():
+    '''Inventories are formatted as NAME=URL[=INVENTORY]'''
+    assert parse_intersphinx("python=" + PYTHON_URL) == \
+        ("python", PYTHON_URL, None)
+    assert parse_intersphinx("python=" + PYTHON_URL + "=objects.inv") == \
+        ("python", PYTHON_URL, "objects.inv")
+    with pytest.raises(ValueError):
+        parse_intersphinx("python")
+
+
+def test_fetch(tmp_path, monkeypatch):
+    '''Inventories are fetched once and refreshed after the ttl'''
+    requests = []
+
+    def urlopen(url, timeout=None):
+        requests.append(url)
+        return BytesIO(b"inventory")
+
+    monkeypatch.setattr(intersphinx, "urlopen", urlopen)
+    cache = InventoryCache(str(tmp_path), ttl=60)
+    assert cache.get("python", PYTHON_URL + "/") == b"inventory"
+    assert cache.get("python", PYTHON_URL) == b"inventory"
+    assert requests == [PYTHON_URL + "/objects.inv"]
+
+    past = time.time() - 120
+    os.utime(str(tmp_path / "python.inv"), (past, past))
+    cache.get("python", PYTHON_URL)
+    assert len(requests) == 2
+
+
+def test_offline(tmp_path, offline):
+    '''The cached inventory is used when the server can not be reached'''
+    cache = InventoryCache(str(tmp_path), ttl=0)
+    assert cache.get("python", PYTHON_URL) is None
+
+    (tmp_path / "python.inv").write_bytes(b"stale")
+    assert cache.get("python", PYTHON_URL) == b"stale"
+    assert len(offline) == 2
+
+
+def test_failed_refresh_waits_for_ttl(tmp_path, offline):
+    '''A failed refresh is not attempted again before the ttl expires'''
+    cache = InventoryCache(str(tmp_path), ttl=60)
+    (tmp_path / "python.inv").write_bytes(b"stale")
+    past = time.time() - 120
+    os.utime(str(tmp_path / "python.inv"), (past, past))
+
+    assert cache.get("python", PYTHON_URL) == b"stale"
+    assert cache.get("python", PYTHON_URL) == b"stale"
+    assert len(offline) == 1
+
+
+def test_inventory_url_ttl(tmp_path, monkeypatch):
+    '''Inventory URLs are cached for the ttl like the default location'''
+    requests = []
+
+    def urlopen(url, timeout=None):
+        requests.append(url)
+        return BytesIO(b"mirror")
+
+    monkeypatch.setattr(intersphinx, "urlopen", urlopen)
+    cache = InventoryCache(str(tmp_path), ttl=3600)
+    for _ in range(3):
+        assert cache.get("numpy", "https://numpy.org",
+                         "https://mirror/objects.inv") == b"mirror"
+    assert requests == ["https://mirror/objects.inv"]
+
+    local = tmp_path / "objects.inv"
+    local.write_bytes(b"local")
+    assert cache.get("numpy", "https://numpy.org", str(local)) == b"local"
+    local.write_bytes(b"updated")
+    assert cache.get("numpy", "https://numpy.org", str(local)) == b"updated"
+
+
+def test_offline_cache(tmp_path, offline):
+    '''Offline caches never fetch, no matter the age of the inventory'''
+    cache = InventoryCache(str(tmp_path), ttl=0, offline=True)
+    assert cache.get("python", PYTHON_URL) is None
+
+    (tmp_path / "python.inv").write_bytes(b"stale")
+    assert cache.get("python", PYTHON_URL) == b"stale"
+    local = tmp_path / "objects.inv"
+    local.write_bytes(b"local")
+    assert cache.get("numpy", "https://numpy.org", str(local)) == b"local"
+    assert offline == []
+
+
+def test_build_plan_intersphinx(tmp_path, offline):
+    '''Imported inventories are rendered into the intersphinx mapping'''
+    inventory = tmp_path / "objects.inv"
+    inventory.write_bytes(b"python inventory")
+    plan = build_plan(
+        PACKAGE_DIR, SOURCE_DIR="out", intersphinx_cache=str(tmp_path / "cache"),
+        intersphinx=[("python", PYTHON_URL, str(inventory)),
+                     ("numpy", "https://numpy.org/doc/stable", None)])
+
+    assert offline == ["https://numpy.org/doc/stable/objects.inv"]
+    assert plan.pages["out/_intersphinx/python.inv"] == b"python inventory"
+    conf = plan.pages["out/conf.py"]
+    assert "intersphinx_mapping = {'python': ('" + PYTHON_URL + \
+        "', '_intersphinx/python.inv')}" in conf
+    assert "'sphinx.ext.intersphinx'" in conf
+    assert plan.artifacts["out/_intersphinx"] is False
@@ -0,0 +1,88 @@
+import time
+import threading
+from autodoc_ext import build_plan
+from autodoc_ext.events import subscribe, unsubscribe, emit, ALL_EVENTS
+from autodoc_ext.metrics import Histogram, PrometheusExporter
+from autodoc_ext.parse import SourceParser
+from autodoc_ext.tree import generate_tree
+from autodoc_ext.templates import generate_rst, FragmentRenderer
+from autodoc_ext.sinks import MemorySink
+from os.path import join, dirname, abspath
+
+
+PACKAGE_DIR = join(dirname(dirname(abspath(__file__))), "autodoc_ext")
+
+
+def test_subscribe_events():
+    '''Subscribers receive the events of a generation'''
+    received = []
+    def callback(event, payload):
+        received.append(event)
+    subscribe(ALL_EVENTS, callback)
+    try:
+        tree = generate_tree(PACKAGE_DIR, parser=SourceParser())
+        generate_rst(tree, "rst", sink=MemorySink(), renderer=FragmentRenderer())
+    finally:
+        unsubscribe(ALL_EVENTS, callback)
+
+    for event in ("tree.walk", "file.parse", "page.render", "rst.write"):
+        assert event in received
+
+
+def test_failing_subscriber():
+    '''A failing subscriber does not interrupt the generation'''
+    def callback(event, payload):
+        raise RuntimeError("failure")
+    subscribe("rst.write", callback)
+    try:
+        emit("rst.write", filename="x", bytes=1)
+    finally:
+        unsubscribe("rst.write", callback)
+
+
+def test_prometheus_textfile(tmp_path):
+    '''The exporter writes counters and histograms'''
+    exporter = PrometheusExporter().attach()
+    try:
+        build_plan(PACKAGE_DIR, cache_dir=str(tmp_path / "cache"))
+    finally:
+        exporter.detach()
+
+    textfile = tmp_path / "autodoc.prom"
+    exporter.write(str(textfile))
+    output = textfile.read_text()
+
+    assert "# TYPE autodoc_ext_files_walked_total counter" in output
+    assert "# TYPE autodoc_ext_parse_seconds histogram" in output
+    assert 'autodoc_ext_cache_misses_total{namespace="summaries"}' in output
+    assert 'autodoc_ext_render_seconds_bucket{le="+Inf"}' in output
+    assert exporter.counters["bytes_written_total"][None] > 0
+
+
+
+class _SlowHistogram(Histogram):
+    '''Histogram whose update is interrupted by the other threads'''
+
+    def observe(self, value):
+        count = self.count
+        time.sleep(0.0001)
+        self.count = count + 1
+
+
+def test_concurrent_events():
+    '''Events of several threads are all counted'''
+    exporter = PrometheusExporter()
+    exporter.histograms["walk_seconds"] = _SlowHistogram()
+
+    def walk():
+        for _ in range(50):
+            exporter.handle("tree.walk", {"files": 1, "seconds": 0.001})
+    threads = [threading.Thread(target=walk) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert exporter.counters["directories_walked_total"][None] == 200
+    assert exporter.histograms["walk_seconds"].count == 200
+    assert "autodoc_ext_walk_seconds_count 200" in exporter.render()
@@ -0,0 +1,189 @@
+import time
+import pytest
+from autodoc_ext import parse
+from autodoc_ext.parse import SourceParser, public_names
+
+
+def test_encoding_cookie(tmp_path):
+    '''Files are decoded with the encoding declared in the file'''
+    source = tmp_path / "latin.py"
+    source.write_bytes(
+        b"# -*- coding: latin-1 -*-\nNAME = '\xe9'\n\nclass Caf\xe9:\n    pass\n")
+
+    assert SourceParser().summary(str(source))["classes"] == ["Café"]
+
+
+def test_prescan_skips_parse(tmp_path, monkeypatch):
+    '''Files without class or def keywords are never parsed'''
+    source = tmp_path / "constants.py"
+    source.write_text("VALUE = 1\nOTHER = 2\n")
+
+    def fail(data):
+        raise AssertionError("parsed")
+    parser = SourceParser()
+    monkeypatch.setattr(parser, "summarize", fail)
+
+    assert parser.summary(str(source)) == SourceParser.empty_summary()
+
+
+def test_mmap_large_file(tmp_path, monkeypatch):
+    '''Large files are memory mapped and parsed'''
+    monkeypatch.setattr(parse, "MMAP_THRESHOLD", 16)
+    source = tmp_path / "large.py"
+    source.write_text("class Large:\n    pass\n" * 4)
+
+    assert SourceParser().summary(str(source))["classes"] == ["Large"] * 4
+
+
+def test_mmap_encoding(tmp_path, monkeypatch):
+    '''Memory mapped files are decoded with the declared encoding'''
+    monkeypatch.setattr(parse, "MMAP_THRESHOLD", 16)
+    latin = tmp_path / "latin.py"
+    latin.write_bytes(
+        b"# -*- coding: latin-1 -*-\nclass Caf\xe9:\n    pass\n")
+    bom = tmp_path / "bom.py"
+    bom.write_bytes(b"\xef\xbb\xbfclass Bom:\n    pass\n")
+
+    parser = SourceParser()
+    assert parser.summary(str(latin))["classes"] == ["Café"]
+    assert parser.summary(str(bom))["classes"] == ["Bom"]
+
+
+def test_empty_file(tmp_path):
+    '''Empty files have an empty summary'''
+    source = tmp_path / "__init__.py"
+    source.write_text("")
+
+    assert SourceParser().summary(str(source)) == SourceParser.empty_summary()
+
+
+def test_module_imports(tmp_path):
+    '''Only absolute imports executed at import time are collected'''
+    source = tmp_path / "imports.py"
+    source.write_text(
+        "import os.path\n"
+        "from numpy import array\n"
+        "from . import sibling\n"
+        "try:\n"
+        "    import pandas as pd\n"
+        "except ImportError:\n"
+        "    pd = None\n"
+        "def lazy():\n"
+        "    import tensorflow\n"
+    )
+
+    summary = SourceParser().summary(str(source))
+    assert summary["imports"] == ["numpy", "os", "pandas"]
+
+
+def test_max_bytes_fallback(tmp_path):
+    '''Files over the size limit are scanned instead of parsed'''
+    source = tmp_path / "generated_pb2.py"
+    source.write_text("import google\nclass Message:\n    class Nested:\n        pass\n")
+
+    parser = SourceParser(max_bytes=10)
+    summary = parser.summary(str(source))
+    assert summary["fallback"]
+    assert summary["classes"] == ["Message", "Nested"]
+    assert summary["imports"] == ["google"]
+    assert parser.report()["largest"][0]["fallback"]
+
+
+def _slow_summarize(source):
+    '''Parse that never finishes within the budget'''
+    time.sleep(30)
+
+
+def test_time_budget_fallback(tmp_path, monkeypatch):
+    '''Files that do not parse within the budget are scanned instead'''
+    monkeypatch.setattr(parse, "ISOLATE_THRESHOLD", 1)
+    monkeypatch.setattr(parse, "_summarize", _slow_summarize)
+    source = tmp_path / "table.py"
+    source.write_text("class Table:\n    pass\n")
+
+    parser = SourceParser(time_budget=0.1)
+    try:
+        summary = parser.summary(str(source))
+    finally:
+        parser.close()
+    assert summary["fallback"]
+    assert summary["classes"] == ["Table"]
+
+
+def test_time_budget_parse(tmp_path, monkeypatch):
+    '''Files parsed within the budget are summarized normally'''
+    monkeypatch.setattr(parse, "ISOLATE_THRESHOLD", 1)
+    source = tmp_path / "small.py"
+    source.write_text("class Small:\n    pass\n")
+
+    parser = SourceParser(time_budget=30)
+    try:
+        summary = parser.summary(str(source))
+    finally:
+        parser.close()
+    assert summary == {
+        "classes": ["Small"], "imports": [],
+        "definitions": [["Small", "class"]], "exports": None,
+        "docstring": "", "docstrings": {}
+    }
+
+
+def test_definitions_and_exports(tmp_path):
+    '''Top level definitions and literal __all__ are summarized'''
+    source = tmp_path / "api.py"
+    source.write_text(
+        "__all__ = ['Client', 'connect']\n"
+        "__all__ += ('VERSION',)\n"
+        "class Client:\n"
+        "    class Nested:\n"
+        "        pass\n"
+        "def connect():\n"
+        "    def inner():\n"
+        "        pass\n"
+        "try:\n"
+        "    async def fetch():\n"
+        "        pass\n"
+        "except ImportError:\n"
+        "    fetch = None\n"
+    )
+
+    summary = SourceParser().summary(str(source))
+    assert summary["classes"] == ["Client", "Nested"]
+    assert summary["definitions"] == [
+        ["Client", "class"], ["connect", "function"], ["fetch", "function"]]
+    assert summary["exports"] == ["Client", "connect", "VERSION"]
+    assert public_names(summary) == ["Client", "connect", "VERSION"]
+
+
+def test_dynamic_exports(tmp_path):
+    '''Without a literal __all__ the public top level names are exported'''
+    source = tmp_path / "helpers.py"
+    source.write_text(
+        "__all__ = [name for name in ('a', 'b')]\n"
+        "class Helper:\n"
+        "    pass\n"
+        "def _private():\n"
+        "    pass\n"
+    )
+
+    summary = SourceParser().summary(str(source))
+    assert summary["exports"] is None
+    assert public_names(summary) == ["Helper"]
+
+    scanned = SourceParser.scan(source.read_bytes())
+    assert scanned["definitions"] == [
+        ["Helper", "class"], ["_private", "function"]]
+    assert public_names(scanned) == ["Helper"]
+
+
+def test_stats_bounded(tmp_path, monkeypatch):
+    '''Only the slowest and largest files are kept once the limit is hit'''
+    monkeypatch.setattr(parse, "MAX_STATS", 8)
+    parser = SourceParser()
+    for index in range(20):
+        source = tmp_path / "mod{}.py".format(index)
+        source.write_text("class C:\n    pass\n" + "#" * index)
+        parser.summary(str(source))
+
+    assert len(parser.stats) <= 8
+    assert parser.report(1)["largest"][0]["filename"].endswith("mod19.py")
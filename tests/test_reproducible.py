@@ -0,0 +1,83 @@
+import hashlib
+import os
+import random
+import pytest
+from autodoc_ext import build_plan, MemorySink, ArchiveSink
+from os.path import join, dirname, abspath
+
+
+PACKAGE_DIR = join(dirname(dirname(abspath(__file__))), "autodoc_ext")
+
+
+class _Entries:
+    '''Result of os.scandir with the entries in a given order'''
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def _shuffle_filesystem(monkeypatch, seed):
+    '''List every directory in a random order'''
+    scandir, listdir = os.scandir, os.listdir
+    shuffle = random.Random(seed).shuffle
+
+    def shuffled_scandir(path):
+        with scandir(path) as entries:
+            entries = list(entries)
+        shuffle(entries)
+        return _Entries(entries)
+
+    def shuffled_listdir(path):
+        names = listdir(path)
+        shuffle(names)
+        return names
+
+    monkeypatch.setattr(os, "scandir", shuffled_scandir)
+    monkeypatch.setattr(os, "listdir", shuffled_listdir)
+    monkeypatch.setattr("autodoc_ext.templates.listdir", shuffled_listdir)
+
+
+def _generate(monkeypatch, seed, archive=None):
+    '''Generate the docs of the package, return the digest of every file
+    and of the archive'''
+    with monkeypatch.context() as patch:
+        _shuffle_filesystem(patch, seed)
+        if archive:
+            with ArchiveSink(archive, root="out") as sink:
+                build_plan(PACKAGE_DIR, sink=sink, PROJECT="TEST",
+                           COPYRIGHT=2020, SOURCE_DIR="out")
+            with open(archive, "rb") as archive_file:
+                return hashlib.sha256(archive_file.read()).hexdigest()
+
+        plan = build_plan(PACKAGE_DIR, sink=MemorySink(), PROJECT="TEST",
+                          COPYRIGHT=2020, SOURCE_DIR="out")
+    return {
+        name: hashlib.sha256(contents.encode("utf-8")).hexdigest()
+        for name, contents in plan.pages.items()
+    }
+
+
+def test_reproducible_pages(monkeypatch):
+    '''The generated files do not depend on the order of the filesystem'''
+    first = _generate(monkeypatch, 1)
+    second = _generate(monkeypatch, 2)
+    assert len(first) > 10
+    assert first == second
+
+
+@pytest.mark.parametrize("extension", [".zip", ".tar.gz", ".tar.xz"])
+def test_reproducible_archives(monkeypatch, tmp_path, extension):
+    '''Archives are byte identical with SOURCE_DATE_EPOCH'''
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1600000000")
+    first = _generate(monkeypatch, 1, str(tmp_path / ("a" + extension)))
+    second = _generate(monkeypatch, 2, str(tmp_path / ("b" + extension)))
+    assert first == second
@@ -0,0 +1,57 @@
+import sys
+import pytest
+from autodoc_ext.serve import PreviewSite, REDIRECT_PAGE
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    package = tmp_path / "pkg"
+    (package / "sub").mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "core.py").write_text("class Core:\n    pass\n")
+    (package / "sub" / "__init__.py").write_text("")
+    # serve the generated rst, sphinx is not required for the tests
+    monkeypatch.setattr(PreviewSite, "_build", lambda self, docname: (
+        200, "text/plain", open("{}/{}.rst".format(
+            self.srcdir, docname), "rb").read()))
+    return PreviewSite(str(package), workdir=str(tmp_path / "work"),
+                       PROJECT="pkg")
+
+
+def test_redirect(site):
+    '''The root redirects to the html index'''
+    assert site.get("/") == (200, "text/html", REDIRECT_PAGE)
+
+
+def test_lazy_pages(site, tmp_path):
+    '''Only requested packages are generated'''
+    status, _, body = site.get("/html/rst_docs/pkg.sub.html")
+    assert status == 200
+    assert b"pkg.sub package" in body
+    assert (tmp_path / "work" / "src" / "rst_docs" / "pkg.sub.rst").exists()
+    assert not (tmp_path / "work" / "src" / "rst_docs" / "pkg.rst").exists()
+    assert site.get("/html/rst_docs/missing.html")[0] == 404
+    assert site.get("/html/../../etc/passwd")[0] == 404
+
+
+def test_invalidation(site, tmp_path):
+    '''Pages are built again when a file of the package changes'''
+    first = site.get("/html/rst_docs/pkg.html")[2]
+    assert site.get("/html/rst_docs/pkg.html")[2] is first
+
+    (tmp_path / "pkg" / "extra.py").write_text("class Extra:\n    pass\n")
+    second = site.get("/html/rst_docs/pkg.html")[2]
+    assert b"pkg.extra" in second
+
+
+def test_mock_imports(tmp_path):
+    '''The third party imports are mocked by default, sys.path is kept'''
+    package = tmp_path / "pkg"
+    package.mkdir()
+    (package / "__init__.py").write_text("import yaml\n")
+    path = list(sys.path)
+    site = PreviewSite(str(package), workdir=str(tmp_path / "work"),
+                       PROJECT="pkg")
+    with open("{}/conf.py".format(site.srcdir)) as conf:
+        assert "autodoc_mock_imports = ['yaml']" in conf.read()
+    assert sys.path == path
@@ -0,0 +1,69 @@
+import pytest
+from autodoc_ext import build_plan, FileSystemSink
+from autodoc_ext.shard import parse_shard, assign_shards, merge_shards
+from autodoc_ext.tree import generate_tree, package_names
+from autodoc_ext.artifacts import ARTIFACTS_FILENAME
+from os import listdir
+from os.path import join, dirname, abspath, exists
+from shutil import move, rmtree
+
+
+PACKAGE_DIR = join(dirname(dirname(abspath(__file__))), "autodoc_ext")
+
+
+def test_parse_shard():
+    '''Shards are formatted as I/N'''
+    assert parse_shard("2/3") == (2, 3)
+    for value in ("0/3", "4/3", "3", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(value)
+
+
+def test_assign_shards_balanced():
+    '''Every package is assigned to exactly one shard'''
+    tree = generate_tree(PACKAGE_DIR)
+    assignment = assign_shards(tree, 2)
+
+    assert set(assignment) == {name for name, _ in package_names(tree)}
+    assert set(assignment.values()) == {1, 2}
+    assert assign_shards(tree, 2) == assignment
+
+
+def test_merge_shards():
+    '''Merged shards contain the pages of every shard'''
+    for index in (1, 2):
+        with FileSystemSink() as sink:
+            build_plan(PACKAGE_DIR, sink=sink, shard=(index, 2),
+                       SOURCE_DIR="shard{}".format(index))
+    shard_pages = [set(listdir("shard{}/rst_docs".format(i))) for i in (1, 2)]
+    assert not shard_pages[0] & shard_pages[1] - {"modules.rst"}
+
+    merge_shards(["shard1", "shard2"], "merged")
+    merged_pages = set(listdir("merged/rst_docs"))
+    assert merged_pages == shard_pages[0] | shard_pages[1]
+    assert exists("merged/conf.py")
+    assert exists(join("merged", ARTIFACTS_FILENAME))
+
+    for directory in ("shard1", "shard2", "merged"):
+        rmtree(directory)
+
+
+def test_merge_moved_shards(tmp_path, monkeypatch):
+    '''Shards are merged from another location than they were created in'''
+    monkeypatch.chdir(str(tmp_path))
+    for index in (1, 2):
+        with FileSystemSink() as sink:
+            build_plan(PACKAGE_DIR, sink=sink, shard=(index, 2),
+                       SOURCE_DIR="shard{}".format(index))
+    shard_pages = [set(listdir("shard{}/rst_docs".format(i))) for i in (1, 2)]
+
+    move("shard1", "downloads/s1")
+    move("shard2", "downloads/s2")
+    merge_shards(["downloads/s1", "downloads/s2"], "merged")
+
+    assert set(listdir("merged/rst_docs")) == \
+        shard_pages[0] | shard_pages[1]
+    with open("merged/Makefile") as makefile:
+        assert "SOURCEDIR     = merged\n" in makefile.read()
+    with open("merged/make.bat") as makebat:
+        assert "set SOURCEDIR= merged" in makebat.read()
@@ -0,0 +1,142 @@
+import os
+import json
+import pytest
+from autodoc_ext import build_plan
+from autodoc_ext.shard import merge_shards
+from autodoc_ext.sinks import FileSystemSink
+from autodoc_ext.symbols import SymbolIndex, load_symbol_index, shard_name
+from autodoc_ext.templates import generate_rst, FragmentRenderer
+from autodoc_ext.tree import generate_tree
+from autodoc_ext.sinks import MemorySink
+
+
+@pytest.fixture
+def project(tmp_path):
+    '''Package with a subpackage, documented classes and functions'''
+    package = tmp_path / "pkg"
+    (package / "sub").mkdir(parents=True)
+    (package / "__init__.py").write_text('"""The package."""\n')
+    (package / "client.py").write_text(
+        '"""Client of the service.\n\nDetails."""\n'
+        "class Client:\n"
+        '    """Connection to the service."""\n'
+        "    class Nested:\n"
+        "        pass\n"
+        "def connect():\n"
+        '    """Open a connection."""\n'
+        "def _helper():\n"
+        "    pass\n"
+    )
+    (package / "sub" / "__init__.py").write_text("")
+    (package / "sub" / "tools.py").write_text("def tool():\n    pass\n")
+    return package
+
+
+def test_shard_name():
+    '''Packages belong to the shard of the root or of its subpackage'''
+    assert shard_name("pkg") == "pkg"
+    assert shard_name("pkg.sub") == "pkg.sub"
+    assert shard_name("pkg.sub.deep") == "pkg.sub"
+
+
+def test_index_generated_pages(project):
+    '''Modules and their exported definitions are indexed by page'''
+    symbols = SymbolIndex()
+    generate_rst(generate_tree(str(project)), "rst", sink=MemorySink(),
+                 renderer=FragmentRenderer(), symbols=symbols)
+
+    assert sorted(symbols.shards) == ["pkg", "pkg.sub"]
+    entries = symbols.shards["pkg"]["pkg"]
+    assert entries["pkg.client"] == [
+        "rst_docs/pkg", "module-pkg.client", "module",
+        "Client of the service."]
+    assert entries["pkg.client.Client"] == [
+        "rst_docs/pkg", "pkg.client.Client", "class",
+        "Connection to the service."]
+    assert entries["pkg.client.connect"][2] == "function"
+    assert "pkg.client.Client.Nested" not in entries
+    assert "pkg.client._helper" not in entries
+    assert entries["pkg"][3] == "The package."
+    assert symbols.shards["pkg.sub"]["pkg.sub"]["pkg.sub.tools.tool"][0] == \
+        "rst_docs/pkg.sub"
+
+
+def test_index_module_layout(project):
+    '''Symbols point to the page of their module'''
+    symbols = SymbolIndex()
+    generate_rst(generate_tree(str(project)), "rst", sink=MemorySink(),
+                 layout="module", renderer=FragmentRenderer(),
+                 symbols=symbols)
+    assert symbols.shards["pkg"]["pkg"]["pkg.client.Client"][0] == \
+        "rst_docs/pkg.client"
+
+
+def test_merge_keeps_other_packages():
+    '''Partial generations only replace the packages they index'''
+    symbols = SymbolIndex()
+    symbols.add_package("pkg.sub", [], {})
+    symbols.merge({
+        "pkg.sub": {"pkg.sub": {"old": []}, "pkg.sub.deep": {"kept": []}},
+        "pkg": {"pkg": {"root": []}}
+    })
+    assert symbols.shards["pkg.sub"]["pkg.sub"] == {}
+    assert symbols.shards["pkg.sub"]["pkg.sub.deep"] == {"kept": []}
+    assert symbols.shards["pkg"]["pkg"] == {"root": []}
+
+
+def test_build_plan_incremental(project, tmp_path):
+    '''Unchanged shards are not written again'''
+    source_dir = str(tmp_path / "out")
+    plan = build_plan(str(project), sink=FileSystemSink(),
+                      SOURCE_DIR=source_dir, symbol_index=True)
+    index_dir = os.path.join(source_dir, "_symbol_index", "symbols")
+    assert os.path.join(source_dir, "_symbol_index") in plan.artifacts
+    with open(os.path.join(source_dir, "conf.py")) as conf:
+        assert "html_extra_path = ['_symbol_index']" in conf.read()
+
+    manifest, shards = load_symbol_index(index_dir)
+    assert sorted(manifest["shards"]) == ["pkg", "pkg.sub"]
+    assert "pkg.client.Client" in shards["pkg"]["pkg"]
+
+    past = 1000000000
+    for name in os.listdir(index_dir):
+        os.utime(os.path.join(index_dir, name), (past, past))
+
+    (project / "sub" / "tools.py").write_text(
+        "def tool():\n    pass\ndef other():\n    pass\n")
+    build_plan(str(project), sink=FileSystemSink(),
+               SOURCE_DIR=source_dir, symbol_index=True)
+
+    def mtime(name):
+        return os.stat(os.path.join(index_dir, name)).st_mtime
+    assert mtime("pkg.json") == past
+    assert mtime("pkg.sub.json") != past
+    assert mtime("index.json") != past
+    with open(os.path.join(index_dir, "pkg.sub.json")) as shard:
+        assert "pkg.sub.tools.other" in json.loads(shard.read())["pkg.sub"]
+
+
+def test_merge_shard_indexes(tmp_path):
+    '''The indexes of the shards are combined when the shards are merged'''
+    package = tmp_path / "pkg"
+    for name in ("a", "b"):
+        (package / name).mkdir(parents=True)
+        (package / name / "__init__.py").write_text("")
+        (package / name / "mod.py").write_text(
+            "def {}_function():\n    pass\n".format(name))
+    (package / "__init__.py").write_text("")
+
+    shard_dirs = []
+    for index in (1, 2):
+        shard_dir = str(tmp_path / "shard{}".format(index))
+        shard_dirs.append(shard_dir)
+        build_plan(str(package), sink=FileSystemSink(), shard=(index, 2),
+                   SOURCE_DIR=shard_dir, symbol_index=True)
+
+    merged = str(tmp_path / "merged")
+    merge_shards(shard_dirs, merged)
+    manifest, shards = load_symbol_index(
+        os.path.join(merged, "_symbol_index", "symbols"))
+    assert sorted(manifest["shards"]) == ["pkg", "pkg.a", "pkg.b"]
+    assert "pkg.a.mod.a_function" in shards["pkg.a"]["pkg.a"]
+    assert "pkg.b.mod.b_function" in shards["pkg.b"]["pkg.b"]
@@ -1,9 +1,13 @@
 import pytest
-from autodoc_ext.templates import generate_sphinx, generate_rst, generate_modules_rst, generate_docs_dir
+from autodoc_ext.templates import generate_sphinx, generate_rst, generate_modules_rst, generate_docs_dir, FragmentRenderer
 from os import remove, makedirs
 from os.path import exists, isfile, join, dirname, abspath
 from shutil import rmtree
-from autodoc_ext.tree import Node
+from autodoc_ext.tree import Node, generate_tree
+from autodoc_ext.sinks import MemorySink
+
+
+PACKAGE_DIR = join(dirname(dirname(abspath(__file__))), "autodoc_ext")
 
 
 def test_template_generation():
@@ -55,4 +59,92 @@ def test_generate_docs_dir():
     assert isfile(join(tempdir, "index.html"))
     assert len(output) > 0
 
-    rmtree(tempdir)    
\ No newline at end of file
+    rmtree(tempdir)    
+
+def test_generate_rst_module_layout():
+    '''Every module receives its own page with a matching toctree'''
+    sink = MemorySink()
+    generate_rst(generate_tree(PACKAGE_DIR), "rst", sink=sink, layout="module")
+
+    assert "rst/autodoc_ext.tree.rst" in sink.files
+    assert ".. automodule:: autodoc_ext.tree" in sink.files["rst/autodoc_ext.tree.rst"]
+    package_page = sink.files["rst/autodoc_ext.rst"]
+    assert "Submodules" in package_page
+    assert "   autodoc_ext.tree" in package_page
+    assert ".. automodule:: autodoc_ext.tree" not in package_page
+
+
+def test_generate_rst_split_pages():
+    '''Pages over the directive budget continue on part pages'''
+    sink = MemorySink()
+    generate_rst(generate_tree(PACKAGE_DIR), "rst", sink=sink, max_directives=2)
+
+    parts = [f for f in sink.files if ".part" in f]
+    assert len(parts) > 0
+    for part in parts:
+        assert sink.files[part].count(".. auto") <= 2
+    package_page = sink.files["rst/autodoc_ext.rst"]
+    assert package_page.count(".. auto") == 2
+    assert "autodoc_ext.part2" in package_page
+
+
+def test_renderer_memoizes_fragments():
+    '''Fragments with the same template and data are rendered once'''
+    renderer = FragmentRenderer()
+    first = renderer.render("{{ A }}", {"A": "x"})
+    assert renderer.render("{{ A }}", {"A": "x"}) is first
+    assert renderer.render("{{ A }}", {"A": "y"}) == "y"
+
+
+def test_renderer_does_not_memoize_pages():
+    '''Only the directive fragments are memoized, never whole pages'''
+    renderer = FragmentRenderer()
+    generate_rst(generate_tree(PACKAGE_DIR), "rst", sink=MemorySink(),
+                 renderer=renderer)
+    assert renderer._fragments
+    for _, data in renderer._fragments:
+        assert "CONTENTS" not in dict(data)
+
+
+def test_renderer_skips_unchanged_pages(monkeypatch):
+    '''Unchanged packages are not rendered again'''
+    renderer = FragmentRenderer()
+    tree = generate_tree(PACKAGE_DIR)
+    first = MemorySink()
+    generate_rst(tree, "rst", sink=first, renderer=renderer)
+
+    def fail(source, data):
+        raise AssertionError("rendered {}".format(data))
+    monkeypatch.setattr(renderer, "render", fail)
+
+    second = MemorySink()
+    generate_rst(tree, "rst", sink=second, renderer=renderer)
+    assert first.files == second.files
+
+
+def test_generate_rst_public_api(tmp_path):
+    '''Only the exported names of the public modules are documented'''
+    package = tmp_path / "pkg"
+    package.mkdir()
+    (package / "__init__.py").write_text("__all__ = ['Client']\n")
+    (package / "client.py").write_text(
+        "__all__ = ['Client']\n"
+        "class Client:\n"
+        "    class Nested:\n"
+        "        pass\n"
+        "class Helper:\n"
+        "    pass\n"
+    )
+    (package / "constants.py").write_text("VALUE = 1\n")
+    (package / "_internal.py").write_text("class Hidden:\n    pass\n")
+
+    sink = MemorySink()
+    generate_rst(generate_tree(str(package)), "rst", sink=sink,
+                 public_api=True, renderer=FragmentRenderer())
+    page = sink.files["rst/pkg.rst"]
+    assert ".. automodule:: pkg\n   :members: Client\n" in page
+    assert ".. automodule:: pkg.client\n   :members: Client\n" in page
+    assert "pkg.constants" not in page
+    assert "Hidden" not in page
+    assert "Nested" not in page
+    assert "autoclass" not in page
@@ -0,0 +1,92 @@
+import csv
+import json
+from types import SimpleNamespace
+from autodoc_ext import build_plan
+from autodoc_ext import timing
+from autodoc_ext.timing import page_package, report_rows, write_report
+from os.path import join, dirname, abspath
+
+
+PACKAGE_DIR = join(dirname(dirname(abspath(__file__))), "autodoc_ext")
+
+
+def test_page_package():
+    '''Pages map to the longest package prefixing the page name'''
+    packages = {"pkg", "pkg.sub"}
+    assert page_package("rst_docs/pkg", packages) == "pkg"
+    assert page_package("rst_docs/pkg.sub", packages) == "pkg.sub"
+    assert page_package("rst_docs/pkg.sub.part2", packages) == "pkg.sub"
+    assert page_package("rst_docs/pkg.module", packages) == "pkg"
+    assert page_package("index", packages) is None
+
+
+def test_report_rows():
+    '''Rows combine the measurements, slowest page first'''
+    rows = report_rows(
+        {"rst_docs/pkg": 1.0, "rst_docs/pkg.sub": 0.5},
+        {"rst_docs/pkg": 0.25, "rst_docs/pkg.sub": 2.0, "index": 0.1},
+        {"rst_docs/pkg": 100},
+        {"pkg", "pkg.sub"})
+    assert [row["docname"] for row in rows] == \
+        ["rst_docs/pkg.sub", "rst_docs/pkg", "index"]
+    assert rows[0]["package"] == "pkg.sub"
+    assert rows[0]["total_seconds"] == 2.5
+    assert rows[1]["bytes"] == 100
+    assert rows[2]["package"] is None
+    assert rows[2]["read_seconds"] == 0.0
+
+
+def test_write_report(tmp_path):
+    '''The report is CSV for a .csv extension, JSON otherwise'''
+    rows = report_rows({"rst_docs/pkg": 1.0}, {}, {}, {"pkg"})
+    write_report(str(tmp_path / "report.json"), rows)
+    assert json.loads((tmp_path / "report.json").read_text()) == rows
+
+    write_report(str(tmp_path / "report.csv"), rows)
+    with open(str(tmp_path / "report.csv")) as report:
+        records = list(csv.DictReader(report))
+    assert records[0]["docname"] == "rst_docs/pkg"
+    assert records[0]["package"] == "pkg"
+
+
+def test_handlers(tmp_path):
+    '''The event handlers measure every page and write the report'''
+    output = tmp_path / "pkg.html"
+    output.write_text("<html></html>")
+    (tmp_path / timing.PACKAGES_FILENAME).write_text(json.dumps(["pkg"]))
+
+    written = []
+    builder = SimpleNamespace(
+        write_doc=lambda docname, doctree: written.append(docname),
+        get_outfilename=lambda docname: str(output))
+    env = SimpleNamespace(docname="rst_docs/pkg")
+    app = SimpleNamespace(
+        env=env, builder=builder, confdir=str(tmp_path),
+        config=SimpleNamespace(autodoc_ext_timing_report="timing.json"))
+
+    timing._env_before_read_docs(app, env, ["rst_docs/pkg"])
+    timing._source_read(app, "rst_docs/pkg", [""])
+    timing._doctree_read(app, None)
+    timing._builder_inited(app)
+    builder.write_doc("rst_docs/pkg", None)
+    timing._build_finished(app, None)
+
+    assert written == ["rst_docs/pkg"]
+    rows = json.loads((tmp_path / "timing.json").read_text())
+    assert len(rows) == 1
+    assert rows[0]["package"] == "pkg"
+    assert rows[0]["bytes"] == len("<html></html>")
+
+
+def test_build_plan_timing():
+    '''The extension, report and package list are added to the plan'''
+    plan = build_plan(
+        PACKAGE_DIR, SOURCE_DIR="out", build_timing="timing.csv")
+    conf = plan.sink.files[join("out", "conf.py")]
+    assert timing.TIMING_EXTENSION in conf
+    assert 'autodoc_ext_timing_report = "timing.csv"' in conf
+
+    packages_file = join("out", timing.PACKAGES_FILENAME)
+    assert "autodoc_ext" in json.loads(plan.sink.files[packages_file])
+    assert packages_file in plan.artifacts
+    assert join("out", "timing.csv") in plan.artifacts
@@ -0,0 +1,162 @@
+from io import StringIO
+import os
+import time
+from autodoc_ext.tree import generate_tree, export_tree, load_tree, external_imports
+from autodoc_ext.tree import TreeSnapshot
+from autodoc_ext.parse import SourceParser
+from os.path import join, dirname, abspath
+
+
+PACKAGE_DIR = join(dirname(dirname(abspath(__file__))), "autodoc_ext")
+
+
+def count_nodes(node):
+    return 1 + sum(count_nodes(child) for child in node.children)
+
+
+def test_summaries_memoized(monkeypatch):
+    '''Files are parsed once no matter how often the classes are requested'''
+    parser = SourceParser()
+    tree = generate_tree(PACKAGE_DIR, parser=parser)
+    first = tree.classes
+
+    def fail(source):
+        raise AssertionError("parsed twice")
+    monkeypatch.setattr(parser, "summarize", fail)
+
+    assert tree.classes == first
+    assert "autodoc_ext.tree::Node" in first
+
+
+def test_export_load_tree(monkeypatch):
+    '''A loaded tree matches the exported tree without parsing files'''
+    tree = generate_tree(PACKAGE_DIR)
+    output = StringIO()
+    count = export_tree(tree, output)
+    assert count == count_nodes(tree)
+
+    parser = SourceParser()
+    def fail(filename):
+        raise AssertionError("read {}".format(filename))
+    monkeypatch.setattr(parser, "summary", fail)
+
+    output.seek(0)
+    loaded = load_tree(output, parser=parser)
+    assert loaded.name == tree.name
+    assert loaded.files == tree.files
+    assert [c.name for c in loaded.children] == [c.name for c in tree.children]
+    assert loaded.templates == tree.templates
+
+
+def test_export_tree_cycle_safe():
+    '''A node reachable more than once is exported once'''
+    tree = generate_tree(PACKAGE_DIR)
+    expected = count_nodes(tree)
+    tree.children.append(tree)
+    output = StringIO()
+    assert export_tree(tree, output) == expected
+
+
+def test_external_imports(tmp_path):
+    '''Only third party imports are reported'''
+    package = tmp_path / "pkg"
+    (package / "sub").mkdir(parents=True)
+    (package / "__init__.py").write_text("import os\nimport numpy as np\n")
+    (package / "helpers.py").write_text("import pkg.sub\nimport helpers\n")
+    (package / "sub" / "mod.py").write_text(
+        "from pandas import DataFrame\nfrom sub import mod\nimport sys\n")
+
+    assert external_imports(generate_tree(str(package))) == ["numpy", "pandas"]
+
+
+def test_concurrent_walk(tmp_path):
+    '''The concurrent walk creates the same tree as the serial walk'''
+    for path in ("a/b/c", "a/d", "e/f/g/h", "i"):
+        (tmp_path / "pkg" / path).mkdir(parents=True)
+        (tmp_path / "pkg" / path / "mod.py").write_text("class A:\n    pass\n")
+    (tmp_path / "pkg" / "a" / "notes.txt").write_text("")
+    (tmp_path / "pkg" / "a" / ".hidden").mkdir()
+    (tmp_path / "pkg" / "skip").mkdir()
+    source = str(tmp_path / "pkg")
+
+    for directory in (source, PACKAGE_DIR):
+        serial, concurrent = StringIO(), StringIO()
+        export_tree(generate_tree(directory, exclusions=["skip"]), serial)
+        export_tree(generate_tree(
+            directory, exclusions=["skip"], workers=4), concurrent)
+        assert serial.getvalue() == concurrent.getvalue()
+
+
+def _age(root, seconds=100):
+    '''Move the modification time of every directory into the past'''
+    past = time.time() - seconds
+    for directory, _, _ in os.walk(str(root)):
+        os.utime(directory, (past, past))
+
+
+def test_tree_snapshot(tmp_path, monkeypatch):
+    '''Unchanged directories are not listed again'''
+    source = tmp_path / "pkg"
+    (source / "a" / "b").mkdir(parents=True)
+    (source / "__init__.py").write_text("")
+    (source / "a" / "b" / "mod.py").write_text("class A:\n    pass\n")
+    (source / "skip").mkdir()
+    _age(source)
+
+    snapshot_file = str(tmp_path / "snapshot.json")
+    snapshot = TreeSnapshot.load(snapshot_file, exclusions=["skip"])
+    generate_tree(str(source), snapshot=snapshot)
+    snapshot.save(snapshot_file)
+    assert (snapshot.listed, snapshot.reused) == (3, 0)
+
+    def scandir(path):
+        raise AssertionError("{} was listed".format(path))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(os, "scandir", scandir)
+        snapshot = TreeSnapshot.load(snapshot_file, exclusions=["skip"])
+        cached = generate_tree(str(source), snapshot=snapshot)
+    assert (snapshot.listed, snapshot.reused) == (0, 3)
+    expected, output = StringIO(), StringIO()
+    export_tree(generate_tree(str(source), exclusions=["skip"]), expected)
+    export_tree(cached, output)
+    assert expected.getvalue() == output.getvalue()
+
+    # adding a file only lists the modified directory again
+    snapshot.save(snapshot_file)
+    (source / "a" / "new.py").write_text("")
+    snapshot = TreeSnapshot.load(snapshot_file, exclusions=["skip"])
+    tree = generate_tree(str(source), snapshot=snapshot)
+    assert (snapshot.listed, snapshot.reused) == (1, 2)
+    assert tree.children[0].files == ["new.py"]
+
+    # a snapshot of other exclusions is not used
+    snapshot = TreeSnapshot.load(snapshot_file, exclusions=[])
+    generate_tree(str(source), snapshot=snapshot)
+    assert snapshot.reused == 0
+
+
+def test_tree_snapshot_summaries(tmp_path):
+    '''Summaries of unchanged files are restored from the snapshot'''
+    source = tmp_path / "pkg"
+    source.mkdir()
+    module = source / "mod.py"
+    module.write_text("class A:\n    pass\n")
+    past = time.time() - 100
+    os.utime(str(module), (past, past))
+
+    snapshot_file = str(tmp_path / "snapshot.json")
+    parser = SourceParser()
+    snapshot = TreeSnapshot.load(snapshot_file)
+    assert generate_tree(str(source), parser=parser, snapshot=snapshot).classes
+    snapshot.save(snapshot_file, parser=parser)
+
+    parser = SourceParser()
+    parser.import_summaries(TreeSnapshot.load(snapshot_file).summaries)
+    tree = generate_tree(str(source), parser=parser)
+    assert tree.classes == ["pkg.mod::A"]
+    assert parser.stats == []
+
+    # edits do not change the modification time of the directory
+    module.write_text("class B:\n    pass\n")
+    assert tree.classes == ["pkg.mod::B"]
@@ -0,0 +1,164 @@
+import json
+import subprocess
+import pytest
+from autodoc_ext.api import build_plan, build_versions, version_dirname
+from autodoc_ext.events import subscribe, unsubscribe
+from autodoc_ext.sinks import MemorySink
+from autodoc_ext.vcs import GitRepository, git_tree
+
+
+def _git(repo, *args):
+    subprocess.check_call(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@test",
+         "-c", "commit.gpgsign=false", "-c", "tag.gpgsign=false"] +
+        list(args), cwd=str(repo), stdout=subprocess.DEVNULL)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    '''Repository with the releases v1 and v2 of src/pkg'''
+    package = tmp_path / "src" / "pkg"
+    (package / "sub").mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "core.py").write_text("class Core:\n    pass\n")
+    (package / "sub" / "__init__.py").write_text("import yaml\n")
+    (package / "README.md").write_text("not documented")
+    _git(tmp_path, "init", "-q")
+    _git(tmp_path, "add", ".")
+    _git(tmp_path, "commit", "-q", "-m", "v1")
+    _git(tmp_path, "tag", "v1")
+
+    (package / "extra.py").write_text("class Extra:\n    pass\n")
+    _git(tmp_path, "add", ".")
+    _git(tmp_path, "commit", "-q", "-m", "v2")
+    _git(tmp_path, "tag", "release/v2")
+
+    # never committed, must not be documented
+    (package / "local.py").write_text("class Local:\n    pass\n")
+    return tmp_path
+
+
+def test_git_tree(repo):
+    '''The tree of a revision matches the committed sources'''
+    with GitRepository(str(repo)) as repository:
+        tree, files = git_tree(repository, "v1", str(repo / "src" / "pkg"))
+
+    assert tree.name == "pkg"
+    assert sorted(tree.files) == ["__init__.py", "core.py"]
+    assert [child.parent for child in tree.children] == ["pkg.sub"]
+    assert tree.classes == ["pkg.core::Core"]
+    assert sorted(files) == [
+        "pkg/__init__.py", "pkg/core.py", "pkg/sub/__init__.py"]
+
+
+def test_build_versions(repo):
+    '''Every version is generated in its own directory, blobs that are
+    shared by the versions are parsed once'''
+    parsed = []
+    callback = lambda event, payload: parsed.append(payload["filename"])
+    subscribe("file.parse", callback)
+    try:
+        sink = MemorySink()
+        plans = build_versions(
+            ["v1", "release/v2"], source=str(repo / "src" / "pkg"),
+            sink=sink, PROJECT="pkg", SOURCE_DIR="out")
+    finally:
+        unsubscribe("file.parse", callback)
+
+    # v1 has three distinct blobs, v2 adds extra.py
+    assert len(parsed) == 4
+    assert set(plans) == {"v1", "release/v2"}
+
+    v2 = version_dirname("release/v2")
+    assert "Extra" not in sink.files["out/v1/rst_docs/pkg.rst"]
+    assert "pkg.extra" in sink.files["out/{}/rst_docs/pkg.rst".format(v2)]
+    assert "release = \"release/v2\"" in sink.files["out/{}/conf.py".format(v2)]
+    assert "['yaml']" in sink.files["out/v1/conf.py"]
+    assert sink.files["out/{}/pkg/extra.py".format(v2)] == \
+        b"class Extra:\n    pass\n"
+    assert not any("local" in name for name in sink.files)
+
+    index = json.loads(sink.files["out/versions.json"])
+    assert [v["path"] for v in index] == ["v1", v2]
+    assert "out/v1: false" in sink.files["out/autodoc_ext_artifacts.yaml"]
+
+
+def test_blobs_read_once(repo, monkeypatch):
+    '''Blobs shared by the versions are read from git once'''
+    repositories = []
+    monkeypatch.setattr(
+        GitRepository, "__enter__",
+        lambda self: repositories.append(self) or self)
+    sink = MemorySink()
+    build_versions(
+        ["v1", "release/v2"], source=str(repo / "src" / "pkg"),
+        sink=sink, PROJECT="pkg", SOURCE_DIR="out")
+
+    with GitRepository(str(repo)) as repository:
+        blobs = set(git_tree(repository, "v1", str(repo / "src" / "pkg"))[1]
+                    .values())
+        blobs.update(git_tree(
+            repository, "release/v2", str(repo / "src" / "pkg"))[1].values())
+    # v2 shares the three files of v1 and adds extra.py
+    assert len(blobs) == 4
+    assert repositories[0].blobs_read == len(blobs)
+    assert sink.files["out/release_v2/pkg/core.py"] == \
+        sink.files["out/v1/pkg/core.py"] == b"class Core:\n    pass\n"
+
+
+def test_unknown_version(repo):
+    '''Unknown references are reported'''
+    with pytest.raises(ValueError):
+        build_versions(["v3"], source=str(repo / "src" / "pkg"))
+
+
+def test_changed_since(repo):
+    '''Only the changed packages and their ancestors are documented'''
+    package = repo / "src" / "pkg"
+    (package / "other").mkdir()
+    (package / "other" / "__init__.py").write_text("")
+    _git(repo, "add", "src/pkg/other")
+    _git(repo, "commit", "-q", "-m", "other")
+    (package / "sub" / "inner").mkdir()
+    (package / "sub" / "inner" / "mod.py").write_text("class Inner:\n    pass\n")
+
+    plan = build_plan(str(package), PROJECT="pkg", SOURCE_DIR="out",
+                      changed_since="HEAD")
+    pages = sorted(name for name in plan.pages if "rst_docs" in name)
+    assert pages == [
+        "out/rst_docs/modules.rst", "out/rst_docs/pkg.rst",
+        "out/rst_docs/pkg.sub.inner.rst", "out/rst_docs/pkg.sub.rst"
+    ]
+    assert "pkg.other" not in plan.pages["out/rst_docs/pkg.rst"]
+
+    # since release/v2: other was committed and local.py is untracked
+    (package / "sub" / "inner" / "mod.py").unlink()
+    (package / "sub" / "inner").rmdir()
+    plan = build_plan(str(package), PROJECT="pkg", SOURCE_DIR="out",
+                      changed_since="release/v2")
+    assert [child.name for child in plan.tree.children] == ["other"]
+
+
+def test_changed_since_mocks_changed_packages(repo):
+    '''Only the files of the documented packages are parsed for mocking'''
+    package = repo / "src" / "pkg"
+    (package / "other").mkdir()
+    (package / "other" / "mod.py").write_text("import numpy\n")
+    _git(repo, "add", "src/pkg/other")
+    _git(repo, "commit", "-q", "-m", "other")
+    (package / "sub" / "mod.py").write_text("class Changed:\n    pass\n")
+
+    parsed = []
+
+    def callback(event, payload):
+        parsed.append(payload["filename"])
+    subscribe("file.parse", callback)
+    try:
+        plan = build_plan(str(package), PROJECT="pkg", SOURCE_DIR="out",
+                          changed_since="HEAD")
+    finally:
+        unsubscribe("file.parse", callback)
+
+    assert not [name for name in parsed if "other" in name]
+    conf = plan.sink.files["out/conf.py"]
+    assert "autodoc_mock_imports = ['yaml']" in conf